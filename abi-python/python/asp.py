@@ -2,16 +2,24 @@
 # It will eventually be added back to that scope - this script is developing
 # new functionality to work with ABI.
 
+import bz2
 import collections
 import copy
-import hashlib
+import gzip
+import io
 import itertools
+import hashlib
+import lzma
+import multiprocessing.util
 import os
+import pickle
 import pprint
 import re
 import sys
+import tempfile
 import time
 import types
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 # Since we parse the die's directly, we use these pyelftools supporting functions.
 from elftools.common.py3compat import bytes2str
@@ -28,11 +36,15 @@ from six import string_types
 # An arbitrary version for this asp.py (libabigail has one, so we are copying)
 __version__ = "1.0.0"
 
+# The layout of the facts we generate (and keep in a FactCache). Bump this
+# whenever a fact is added, removed or changes its arguments.
+FACTS_FORMAT_VERSION = 3
+
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 try:
     import clingo
-    from corpus import ABIParser
+    from corpus import ABIParser, elf_handles, get_content_id, get_die_filepath
 
     # There may be a better way to detect this
     clingo_cffi = hasattr(clingo.Symbol, "_rep")
@@ -128,6 +140,236 @@ class AspFunction(AspObject):
         return str(self)
 
 
+class SymbolInterner(object):
+    """Intern the clingo symbols for fact arguments. The first argument of
+    a fact is almost always the same corpus path, and names and tags repeat
+    constantly, so we make each clingo.String / clingo.Number once per solve.
+    Whole facts repeat less (e.g., checking the same library again in a
+    session), but a lookup is cheap next to making the clingo.Function, so
+    we intern those too.
+    """
+
+    def __init__(self):
+        self.strings = {}
+        self.numbers = {}
+        self.functions = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __str__(self):
+        return "[SymbolInterner:%s]" % (
+            len(self.strings) + len(self.numbers) + len(self.functions)
+        )
+
+    def __repr__(self):
+        return str(self)
+
+    @property
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": float(self.hits) / total if total else 0.0,
+        }
+
+    def function(self, name, args, positive=True):
+        """Make the clingo.Function for a fact, the same as AspFunction.symbol"""
+        if not isinstance(args, tuple):
+            args = tuple(args)
+
+        # True == 1 in a key, so we never keep a fact with a bool argument.
+        # We don't keep one with an unhashable argument (e.g., a list) either
+        key = (name, args, positive)
+        try:
+            function = self.functions.get(key)
+        except TypeError:
+            key = function = None
+        if function is not None and not any(arg.__class__ is bool for arg in args):
+            self.hits += 1
+            return function
+
+        strings = self.strings
+        numbers = self.numbers
+        terms = []
+        has_bool = False
+        for arg in args:
+            # bool is a subclass of int, but we write it as a string
+            if isinstance(arg, int) and not isinstance(arg, bool):
+                term = numbers.get(arg)
+                if term is None:
+                    term = numbers[arg] = clingo.Number(arg)
+                    self.misses += 1
+                else:
+                    self.hits += 1
+            else:
+                if isinstance(arg, bool):
+                    has_bool = True
+                if not isinstance(arg, str):
+                    arg = str(arg)
+                term = strings.get(arg)
+                if term is None:
+                    term = strings[arg] = clingo.String(arg)
+                    self.misses += 1
+                else:
+                    self.hits += 1
+            terms.append(term)
+
+        function = clingo.Function(name, terms, positive)
+        if key is not None and not has_bool:
+            self.functions[key] = function
+        return function
+
+
+class CompactSchema(object):
+    """A CompactSchema encodes the long strings in facts (corpus paths, symbol
+    and DIE names, and DIE ids) as integers, so clingo grounds small numbers
+    instead of hashing and comparing strings. Each value gets a side table
+    fact the first time we see it:
+
+    corpus_path(Id, Path).
+    symbol_name(Id, Name).
+    die_offset(Id, CorpusId, Offset).
+
+    Symbol names and DIE names share one table, since the rules join them.
+    The rules only compare these values with each other, so they work
+    unchanged, and decode() translates the atoms of a model back.
+    """
+
+    side_tables = set(["corpus_path", "symbol_name", "die_offset"])
+
+    # The shown atoms of is_compatible.lp that aren't facts we generate
+    outputs = {
+        "is_main": ("corpus",),
+        "is_library": ("corpus",),
+        "is_needed": ("corpus",),
+        "get_missing_symbols": ("name",),
+        "library_formal_parameters": ("corpus", "die", "name", "die"),
+        "main_formal_parameters": ("corpus", "die", "name", "die"),
+        # and of is_compatible_session.lp
+        "are_compatible": ("corpus",),
+        "missing_symbols": ("corpus", "name"),
+        "count_missing_symbols": ("corpus",),
+        "architecture_mismatch": ("corpus",),
+        "function_parameters_missing": ("corpus", "name"),
+        "function_parameters_size_mismatch": ("corpus", "name"),
+        "function_parameters_type_mismatch": ("corpus", "name", "name", "name"),
+    }
+
+    def __init__(self, corpus_ids=None):
+        # Corpus ids can be shared with the solver setup (used in DIE ids)
+        self.corpus_ids = corpus_ids if corpus_ids is not None else {}
+        self.names = {}
+        self.dies = {}
+        self.kinds = {}
+
+        # Side table facts waiting to be added
+        self.pending = []
+        self.seen_corpora = set()
+
+        # Lookups of integer to value, by kind, for decode
+        self.reverse = {}
+
+    def __str__(self):
+        return "[CompactSchema:%s:%s:%s]" % (
+            len(self.corpus_ids),
+            len(self.names),
+            len(self.dies),
+        )
+
+    def __repr__(self):
+        return str(self)
+
+    def get_kinds(self, name):
+        """Get the kinds of the leading arguments of a predicate"""
+        kinds = self.kinds.get(name)
+        if kinds is not None:
+            return kinds
+
+        base = name[len("needed_") :] if name.startswith("needed_") else name
+        if name in self.side_tables:
+            kinds = ()
+        elif name in self.outputs:
+            kinds = self.outputs[name]
+        elif base == "die_has_child":
+            kinds = ("die", "die")
+        elif base.startswith("dw_tag_") and base.endswith("_name"):
+            kinds = ("corpus", "die", "name")
+        elif base.startswith("dw_tag_"):
+            kinds = ("corpus", "die")
+        elif base == "symbol":
+            kinds = ("name",)
+        elif base.startswith("symbol_") or base.startswith("has_"):
+            kinds = ("corpus", "name")
+        elif base.startswith("corpus"):
+            kinds = ("corpus",)
+        else:
+            kinds = ()
+        self.kinds[name] = kinds
+        return kinds
+
+    def encode_corpus(self, path):
+        identifier = self.corpus_ids.get(path)
+        if identifier is None:
+            identifier = self.corpus_ids[path] = len(self.corpus_ids)
+        if identifier not in self.seen_corpora:
+            self.seen_corpora.add(identifier)
+            self.pending.append(fn.corpus_path(identifier, path))
+        return identifier
+
+    def encode_name(self, name):
+        identifier = self.names.get(name)
+        if identifier is None:
+            identifier = self.names[name] = len(self.names)
+            self.pending.append(fn.symbol_name(identifier, name))
+        return identifier
+
+    def encode_die(self, die_id):
+        identifier = self.dies.get(die_id)
+        if identifier is None:
+            identifier = self.dies[die_id] = len(self.dies)
+            corpus_id, offset = die_id.split(":")
+            self.pending.append(fn.die_offset(identifier, int(corpus_id), int(offset)))
+        return identifier
+
+    def encode(self, name, args):
+        """Encode the arguments of a fact, returning the new arguments"""
+        kinds = self.get_kinds(name)
+        if not kinds:
+            return args
+        args = list(args)
+        for idx, kind in enumerate(kinds[: len(args)]):
+            if kind == "corpus":
+                args[idx] = self.encode_corpus(args[idx])
+            elif kind == "name":
+                args[idx] = self.encode_name(str(args[idx]))
+            else:
+                args[idx] = self.encode_die(args[idx])
+        return args
+
+    def decode(self, symbol):
+        """Translate an atom with integer arguments back to a clingo.Function
+        with the strings we started with.
+        """
+        kinds = self.get_kinds(symbol.name)
+        if not kinds:
+            return symbol
+        for kind, lookup in [
+            ("corpus", self.corpus_ids),
+            ("name", self.names),
+            ("die", self.dies),
+        ]:
+            if len(self.reverse.get(kind, {})) != len(lookup):
+                self.reverse[kind] = dict((v, k) for k, v in lookup.items())
+        args = list(symbol.arguments)
+        for idx, kind in enumerate(kinds[: len(args)]):
+            if args[idx].type == clingo.SymbolType.Number:
+                value = self.reverse[kind].get(args[idx].number)
+                if value is not None:
+                    args[idx] = clingo.String(value)
+        return clingo.Function(symbol.name, args, symbol.positive)
+
+
 class AspFunctionBuilder(object):
     def __getattr__(self, name):
         return AspFunction(name)
@@ -158,28 +400,303 @@ class Result(object):
             )
 
 
+class PrecheckResult(Result):
+    """
+    The Result of a SymbolPrecheck. It's decided when the candidate is
+    missing symbols (so it can't be compatible) and we don't need the solver.
+    The answers are only the corpus and missing symbol atoms. The solver
+    would also show architecture_mismatch, function_parameters_missing,
+    function_parameters_size_mismatch and function_parameters_type_mismatch
+    atoms for the symbols that are there, and we don't compute those.
+    """
+
+    def __init__(self, binary, library, candidate, missing):
+        super(PrecheckResult, self).__init__()
+        self.candidate = candidate
+        self.missing = sorted(missing)
+        self.decided = bool(self.missing)
+        self.satisfiable = True
+        self.nmodels = 1
+        self.answers = sorted(
+            [
+                ("is_main", [binary]),
+                ("is_needed", [library]),
+                ("is_library", [candidate]),
+                ("count_missing_symbols", [candidate, str(len(self.missing))]),
+            ]
+            + [("missing_symbols", [candidate, symbol]) for symbol in self.missing]
+        )
+
+    def __str__(self):
+        return "[PrecheckResult:%s:%s]" % (self.candidate, len(self.missing))
+
+    def __repr__(self):
+        return str(self)
+
+
+class SymbolPrecheck(object):
+    """
+    The missing symbol rules of is_compatible.lp are set algebra: the symbols
+    the binary needs (undefined in it) and the library known to work defines,
+    minus the symbols a candidate defines. We can answer that over the symbol
+    tables in milliseconds, and only need the solver for the type checks when
+    nothing is missing.
+    """
+
+    def __init__(self, binary, library, parser=None):
+        """
+        Arguments:
+            binary (str): path to the binary
+            library (str): path to a library that is known to work
+            parser (ABIParser): share corpora with a parser (optional)
+        """
+        self.parser = parser or ABIParser()
+        self.binary = self.parser.get_corpus_from_elf(binary)
+        self.library = self.parser.get_corpus_from_elf(library)
+
+        # The empty (null) symbol isn't a fact, so we don't count it
+        needed = self.library.elfsymbols.defined_names()
+        undefined = self.binary.elfsymbols.undefined_names()
+        self.needed = (needed & undefined) - set([""])
+
+    def __str__(self):
+        return "[SymbolPrecheck:%s:%s]" % (self.binary.path, len(self.needed))
+
+    def __repr__(self):
+        return str(self)
+
+    def check(self, candidate):
+        """
+        Check a candidate library, returning a PrecheckResult.
+        """
+        corpus = self.parser.get_corpus_from_elf(candidate)
+        missing = self.needed - corpus.elfsymbols.defined_names()
+        return PrecheckResult(
+            self.binary.path, self.library.path, corpus.path, missing
+        )
+
+
+class FactSink(object):
+    """A FactSink is where the text of an ASP program goes, if anywhere.
+    Rendering a fact to text is only done for a sink that is enabled.
+    """
+
+    enabled = True
+
+    def write(self, text):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class NullSink(FactSink):
+    """Throw away the text (facts still go to the solver)"""
+
+    enabled = False
+
+    def write(self, text):
+        pass
+
+
+class StreamSink(FactSink):
+    """Write the text to an open stream (e.g., sys.stdout)"""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, text):
+        self.stream.write(text)
+
+
+class BufferSink(FactSink):
+    """Keep the text in memory, and get it back with getvalue()"""
+
+    def __init__(self):
+        self.buffer = io.StringIO()
+
+    def write(self, text):
+        self.buffer.write(text)
+
+    def getvalue(self):
+        return self.buffer.getvalue()
+
+
+class CompressedFileSink(FactSink):
+    """Write the text to a compressed file, with the compression chosen by
+    the extension (.gz, .bz2 or .xz, and gzip otherwise)
+    """
+
+    openers = {".gz": gzip.open, ".bz2": bz2.open, ".xz": lzma.open}
+
+    def __init__(self, filename):
+        self.filename = filename
+        opener = self.openers.get(os.path.splitext(filename)[-1], gzip.open)
+        self.fd = opener(filename, "wt")
+
+    def write(self, text):
+        self.fd.write(text)
+
+    def close(self):
+        self.fd.close()
+
+
+def get_sink(out):
+    """Get a FactSink for a sink, a stream, or None (nothing)"""
+    if out is None:
+        return NullSink()
+    if isinstance(out, FactSink):
+        return out
+    return StreamSink(out)
+
+
+class FactCache(object):
+    """A FactCache keeps the facts generated for one corpus in one role on
+    disk, so checking the same binary against many libraries only walks its
+    DWARF once. The key is the content of the corpus (GNU build-id or sha256),
+    the role, and FACTS_FORMAT_VERSION. Facts also include the corpus path
+    and id (in DIE ids), so those are part of the key too. Like a CorpusCache,
+    the directory is bounded in size, evicting the least recently used first.
+    """
+
+    def __init__(self, cache_dir, max_size=512 * 1024 * 1024):
+        self.cache_dir = os.path.abspath(cache_dir)
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __str__(self):
+        return "[FactCache:%s]" % self.cache_dir
+
+    def __repr__(self):
+        return str(self)
+
+    @property
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    def get_key(self, corpus, role, corpus_id):
+        context = "%s:%s" % (corpus.path, corpus_id)
+        return "%s-%s-%s-%s" % (
+            get_content_id(corpus.path),
+            role,
+            hashlib.sha256(context.encode("utf-8")).hexdigest()[:16],
+            FACTS_FORMAT_VERSION,
+        )
+
+    def get_path(self, key):
+        return os.path.join(self.cache_dir, key + ".facts")
+
+    def load(self, key):
+        """Load the facts for a key, a list of (name, args) or None"""
+        path = self.get_path(key)
+
+        # An entry from another version of this code might not unpickle
+        try:
+            with open(path, "rb") as fd:
+                facts = pickle.load(fd)
+        except (
+            OSError,
+            EOFError,
+            pickle.UnpicklingError,
+            AttributeError,
+            ImportError,
+            IndexError,
+            TypeError,
+            ValueError,
+        ):
+            facts = None
+        if not isinstance(facts, list):
+            self.misses += 1
+            return None
+
+        # Mark the entry as recently used
+        os.utime(path)
+        self.hits += 1
+        return facts
+
+    def save(self, key, facts):
+        """Save a list of (name, args) facts atomically, and evict old entries
+        if needed
+        """
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as out:
+            pickle.dump(facts, out, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.get_path(key))
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until we are under max_size"""
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".facts"):
+                continue
+            st = os.stat(os.path.join(self.cache_dir, name))
+            entries.append((st.st_mtime, st.st_size, name))
+            total += st.st_size
+
+        for _, size, name in sorted(entries):
+            if total <= self.max_size:
+                break
+            os.remove(os.path.join(self.cache_dir, name))
+            total -= size
+            self.evictions += 1
+
+
 class PyclingoDriver(object):
-    def __init__(self, cores=True, asp=None):
+    def __init__(
+        self, cores=True, asp=None, batch_size=10000, intern=True, cache_dir=None
+    ):
         """Driver for the Python clingo interface.
 
         Arguments:
             cores (bool): whether to generate unsatisfiable cores for better
                 error reporting.
-            asp (file-like): optional stream to write a text-based ASP program
-                for debugging or verification.
+            asp (file-like or FactSink): optional stream or sink to write a
+                text-based ASP program for debugging or verification. By
+                default we don't render text at all.
+            batch_size (int): how many facts to add to the backend at once
+            intern (bool): intern clingo symbols for repeated fact arguments
+            cache_dir (path): cache the facts for each corpus here, and load
+              them instead of generating them again
         """
         global clingo
-        self.out = asp or sys.stdout  # self.devnull
+        self.out = asp
         self.cores = cores
+        self.batch_size = batch_size
+        self.intern = intern
+        self.facts = []
+        self.nfacts = 0
+        self.symbols = SymbolInterner()
+
+        # An optional CompactSchema, set by the solver setup
+        self.schema = None
+
+        # Facts cached per corpus, and a list to record facts into
+        self.fact_cache = FactCache(cache_dir) if cache_dir else None
+        self.recording = None
+
+    @property
+    def out(self):
+        return self._out
+
+    @out.setter
+    def out(self, out):
+        self._out = get_sink(out)
 
     def devnull(self):
-        self.f = open(os.devnull, "w")
-        self.out = f
+        self.out = NullSink()
 
-    def __exit__(self):
-        self.f.close()
+    def close(self):
+        self.out.close()
 
     def title(self, name, char):
+        if not self.out.enabled:
+            return
         self.out.write("\n")
         self.out.write("%" + (char * 76))
         self.out.write("\n")
@@ -198,14 +715,56 @@ class PyclingoDriver(object):
 
     def fact(self, head):
         """ASP fact (a rule without a body)."""
-        symbol = head.symbol() if hasattr(head, "symbol") else head
+        # We record facts before they are encoded. Side table facts have the
+        # integer ids of this run, so they are made again when we replay
+        if (
+            self.recording is not None
+            and isinstance(head, AspFunction)
+            and head.name not in CompactSchema.side_tables
+        ):
+            self.recording.append((head.name, tuple(head.args)))
+
+        if self.schema is not None and isinstance(head, AspFunction):
+            head = AspFunction(head.name, self.schema.encode(head.name, head.args))
+
+            # New values come with side table facts
+            while self.schema.pending:
+                self.fact(self.schema.pending.pop(0))
+
+        if self.intern and isinstance(head, AspFunction):
+            symbol = self.symbols.function(head.name, head.args)
+        else:
+            symbol = head.symbol() if hasattr(head, "symbol") else head
+
+        if self.out.enabled:
+            self.out.write("%s.\n" % str(symbol))
 
-        self.out.write("%s.\n" % str(symbol))
+        # Facts go to the backend in batches (see flush)
+        self.facts.append(symbol)
+        if len(self.facts) >= self.batch_size:
+            self.flush()
 
-        atom = self.backend.add_atom(symbol)
-        self.backend.add_rule([atom], [], choice=self.cores)
+    def load_facts(self, facts):
+        """Add facts that were recorded (e.g., from the FactCache)"""
+        for name, args in facts:
+            self.fact(AspFunction(name, args))
+
+    def flush(self):
+        """Add the facts we have so far to the backend. With cores, a batch
+        is one choice rule with every atom in the head, which is the same as
+        a choice rule per atom.
+        """
+        if not self.facts:
+            return
+        atoms = [self.backend.add_atom(symbol) for symbol in self.facts]
         if self.cores:
-            self.assumptions.append(atom)
+            self.backend.add_rule(atoms, [], choice=True)
+            self.assumptions.extend(atoms)
+        else:
+            for atom in atoms:
+                self.backend.add_rule([atom])
+        self.nfacts += len(self.facts)
+        self.facts = []
 
     def solve(
         self,
@@ -252,9 +811,13 @@ class PyclingoDriver(object):
 
         # set up the problem -- this generates facts and rules
         self.assumptions = []
+        self.facts = []
+        self.nfacts = 0
+        self.symbols = SymbolInterner()
         with self.control.backend() as backend:
             self.backend = backend
             solver_setup.setup(self, corpora, tests=tests)
+            self.flush()
         timer.phase("setup")
 
         # If we only want to generate facts, cut out early
@@ -279,7 +842,10 @@ class PyclingoDriver(object):
         cores = []  # unsatisfiable cores if they do not
 
         def on_model(model):
-            models.append((model.cost, model.symbols(shown=True, terms=True)))
+            symbols = model.symbols(shown=True, terms=True)
+            if self.schema is not None:
+                symbols = [self.schema.decode(symbol) for symbol in symbols]
+            models.append((model.cost, symbols))
 
         # Won't work after this, need to write files
         solve_kwargs = {
@@ -334,6 +900,14 @@ class PyclingoDriver(object):
         if stats:
             print("Statistics:")
             pprint.pprint(self.control.statistics)
+            print("Symbol interning:")
+            pprint.pprint(self.symbols.stats)
+            if self.fact_cache is not None:
+                print("Fact cache:")
+                pprint.pprint(self.fact_cache.stats)
+            if solver_setup.prune_stats:
+                print("Pruned DIEs:")
+                pprint.pprint(solver_setup.prune_stats)
 
         return result
 
@@ -341,7 +915,14 @@ class PyclingoDriver(object):
 class ABICompatSolverSetup(object):
     """Class to set up and run an ABI Compatability Solver."""
 
-    def __init__(self):
+    def __init__(self, compact=False, prune=False):
+        """
+        Arguments:
+            compact (bool): encode corpora, names and DIEs as integers
+              (see CompactSchema)
+            prune (bool): only generate facts for the DIEs relevant to the
+              symbols the binary imports (see corpus.DieSlice)
+        """
         self.gen = None  # set by setup()
 
         # A lookup of DIEs based on corpus path (first key) and id
@@ -352,6 +933,44 @@ class ABICompatSolverSetup(object):
         self.child_lookup = {}
         self.language = None
 
+        # A lookup of corpus path to a small integer id, used in DIE ids
+        self.corpus_ids = {}
+        self.schema = CompactSchema(self.corpus_ids) if compact else None
+
+        # When we prune, the symbols the binary imports, and a slice of DIEs
+        # (and how many we kept and skipped) for each corpus
+        self.prune = prune
+        self.relevant_symbols = None
+        self.die_slices = {}
+        self.prune_stats = {}
+
+    def set_relevant_symbols(self, binary):
+        """
+        Pruning is driven by the symbols the binary imports (the undefined
+        symbols), so we find those first. The rules also match functions by
+        name (e.g., a C++ function with a different signature in a library),
+        so we add the names the binary's DWARF gives them. We keep the slice
+        of the binary for generating its facts.
+        """
+        if not self.prune:
+            return
+        symbols = set()
+        for symbol, meta in binary.elfsymbols.items():
+            if symbol and meta["defined"] == "UND":
+                symbols.add(symbol.split("@", 1)[0])
+        die_slice = binary.get_die_slice(symbols)
+        self.relevant_symbols = symbols | die_slice.root_names
+        die_slice.add_names(self.relevant_symbols)
+        self.die_slices[binary.path] = die_slice
+
+    @property
+    def prune_key(self):
+        """A key for the facts we generate when pruning (used to cache them)"""
+        if self.relevant_symbols is None:
+            return ""
+        names = "\n".join(sorted(self.relevant_symbols)).encode("utf-8")
+        return "pruned-%s" % hashlib.sha256(names).hexdigest()[:16]
+
     def generate_elf_symbols(self, corpora, prefix=""):
         """For each corpus, write out elf symbols as facts. Note that we are
         trying a more detailed approach with facts/atoms being named (e.g.,
@@ -411,17 +1030,31 @@ class ABICompatSolverSetup(object):
                 self.gen.fact(AspFunction(has + "symbol", args=[corpus.path, symbol]))
                 self.gen.fact(fn.has_symbol(corpus.path, symbol))
 
-    def _die_hash(self, die, corpus, parent):
+    def _get_corpus_id(self, corpus):
+        """
+        Get the integer id for a corpus, assigned in the order we see them.
+        The corpus_id facts are the mapping table back to the corpus path.
+        """
+        if corpus.path not in self.corpus_ids:
+            self.corpus_ids[corpus.path] = len(self.corpus_ids)
+        return self.corpus_ids[corpus.path]
+
+    def _die_id(self, die, corpus):
         """
-        We need a unique id for a die entry based on it's corpus, cu, content
+        We need a unique id for a die entry. The offset of a DIE in
+        .debug_info is unique within the corpus, so the corpus id and offset
+        are all we need (and the same DIE always gets the same id).
         """
-        hasher = hashlib.md5()
-        hasher.update(str(die).encode("utf-8"))
-        hasher.update(corpus.path.encode("utf-8"))
-        hasher.update(str(die.cu.cu_offset).encode('utf-8'))
-        if parent:
-            hasher.update(parent.encode("utf-8"))
-        return hasher.hexdigest()
+        return "%s:%s" % (self._get_corpus_id(corpus), die.offset)
+
+    def get_die_location(self, die_id):
+        """
+        Given a DIE id, get back the corpus path and .debug_info offset.
+        """
+        corpus_id, offset = die_id.split(":")
+        for path, identifier in self.corpus_ids.items():
+            if identifier == int(corpus_id):
+                return path, int(offset)
 
     def generate_needed(self, corpora):
         """
@@ -442,16 +1075,33 @@ class ABICompatSolverSetup(object):
         for corpus in corpora:
             self.gen.h2("Corpus DIE: %s" % corpus.path)
 
-            # Add to child and die lookup, for redundancy check
-            if corpus.path not in self.die_lookup:
-                self.die_lookup[corpus.path] = {}
-            if corpus.path not in self.child_lookup:
-                self.child_lookup[corpus.path] = {}
+            # Add to child and die lookup, for redundancy check. DIEs are
+            # parsed once for each prefix
+            self.die_lookup[corpus.path] = {}
+            self.child_lookup[corpus.path] = {}
+
+            # If we prune, we only parse the slice of DIEs for the symbols
+            # (the binary's is already there from set_relevant_symbols)
+            die_slice = self.die_slices.get(corpus.path)
+            if self.relevant_symbols is None:
+                self.die_slices.pop(corpus.path, None)
+            elif die_slice is None or die_slice.names != self.relevant_symbols:
+                die_slice = corpus.get_die_slice(self.relevant_symbols)
+                self.die_slices[corpus.path] = die_slice
+            if self.relevant_symbols is not None:
+                self.prune_stats[corpus.path] = {
+                    "kept": len(die_slice.offsets),
+                    "skipped": die_slice.skipped,
+                }
+                self.gen.h2(
+                    "Pruned %s of %s DIEs" % (die_slice.skipped, die_slice.total)
+                )
 
+            lookup = self.die_lookup[corpus.path]
             for die in corpus.iter_dwarf_information_entries():
 
-                # Skip entries without tags
-                if not die.tag:
+                # Skip entries without tags, or already parsed with a parent
+                if not die.tag or self._die_id(die, corpus) in lookup:
                     continue
 
                 # Parse the die entry!
@@ -467,6 +1117,7 @@ class ABICompatSolverSetup(object):
             return "%s_%s" % (corpus.path, die.abbrev_code)
 
         lookup = self.child_lookup[corpus.path]
+        die_slice = self.die_slices.get(corpus.path)
 
         # Add the child lookup
         if die.unique_id not in lookup:
@@ -480,9 +1131,11 @@ class ABICompatSolverSetup(object):
         # We add one each time, so count starts at 0 after that
         parameter_count = -1
         for child in die.iter_children():
-            child_id = self._die_hash(child, corpus, die.unique_id)
+            child_id = self._die_id(child, corpus)
             if child_id in lookup[die.unique_id]:
                 continue
+            if die_slice is not None and child.offset not in die_slice:
+                continue
             lookup[die.unique_id].add(child_id)
 
             # If it's a subprogram, we care about order of parameters
@@ -535,12 +1188,15 @@ class ABICompatSolverSetup(object):
         # Get the tag for the die
         tag = self._get_tag(die, prefix)
 
-        # Keep track of unique id for relationships (hash of attributes, parent, and corpus)
-        die.unique_id = self._die_hash(die, corpus, parent)
+        # Keep track of unique id for relationships (corpus id and offset)
+        die.unique_id = self._die_id(die, corpus)
 
-        # Don't parse an entry twice
-        # if die.abbrev_code in self.die_lookup[corpus.path]:
-        #    return
+        # Don't parse an entry twice, or one that was pruned
+        if die.unique_id in self.die_lookup[corpus.path]:
+            return
+        die_slice = self.die_slices.get(corpus.path)
+        if die_slice is not None and die.offset not in die_slice:
+            return
 
         # Create a top level entry for the die based on it's tag type
         self.gen.fact(AspFunction(tag, args=[corpus.path, die.unique_id]))
@@ -549,7 +1205,7 @@ class ABICompatSolverSetup(object):
         self._add_children(corpus, die, prefix)
 
         # Add to the lookup
-        self.die_lookup[corpus.path][die.abbrev_code] = die
+        self.die_lookup[corpus.path][die.unique_id] = die
 
         # Parse common attributes
         self._parse_common_attributes(corpus, die, tag)
@@ -743,7 +1399,7 @@ class ABICompatSolverSetup(object):
             )
 
         # Some attributes have a filepath
-        filepath = _get_die_filepath(die)
+        filepath = get_die_filepath(die)
         if filepath:
             self.gen.fact(
                 AspFunction(
@@ -815,94 +1471,64 @@ class ABICompatSolverSetup(object):
                 )
             )
 
-    def _parse_die_type(self, corpus, die, tag, lookup_die=None):
+    def _parse_die_type(self, corpus, die, tag):
         """
         Parse the die type, typically getting the size in bytes or
-        looking it up. If lookup die is provided, it means we are digging into
-        layers and are looking for a type for "die"
+        looking it up. The corpus type index follows DW_AT_type through the
+        layers (typedef, const, etc.) once, and we get back the final type.
 
         Might be useful:
         https://www.gitmemory.com/issue/eliben/pyelftools/353/784166976
 
         """
-        type_die = None
-
-        # The die we query for the type is either the die itself, or one we've
-        # already found
-        query_die = lookup_die or die
-
-        # CU relative offset
-        if query_die.attributes["DW_AT_type"].form.startswith("DW_FORM_ref"):
-            type_die = query_die.cu.get_DIE_from_refaddr(
-                query_die.attributes["DW_AT_type"].value
-            )
-
-        # Absolute offset
-        elif query_die.attributes["DW_AT_type"].startswith("DW_FORM_ref_addr"):
-            print("ABSOLUTE OFFSET")
-            import IPython
-
-            IPython.embed()
+        type_record = corpus.get_type_index().get_type(die)
 
         # If we grabbed the type, just explicitly write the size/type
         # In the future we could reference another die, but don't
         # have it's parent here at the moment
-        if type_die:
-
-            # If we have another type def, call function again until we find it
-            if "DW_AT_type" in type_die.attributes:
-                return self._parse_die_type(corpus, die, tag, type_die)
-
-            # If it's a pointer, we have the byte size (no name)
-            if type_die.tag == "DW_TAG_pointer_type":
-                if "DW_AT_byte_size" in type_die.attributes:
-                    size_in_bits = type_die.attributes["DW_AT_byte_size"].value * 8
-                    self.gen.fact(
-                        AspFunction(
-                            tag + "_size_in_bits",
-                            args=[corpus.path, die.unique_id, size_in_bits],
-                        )
-                    )
+        if not type_record:
+            return
 
-            # Not sure how to parse non complete types
-            # https://stackoverflow.com/questions/38225269/dwarf-reading-not-complete-types
-            elif "DW_AT_declaration" in type_die.attributes:
+        # If it's a pointer, we have the byte size (no name)
+        if type_record.tag == "DW_TAG_pointer_type":
+            if type_record.size_in_bits is not None:
                 self.gen.fact(
                     AspFunction(
-                        tag + "_non_complete_type",
-                        args=[corpus.path, die.unique_id, "yes"],
+                        tag + "_size_in_bits",
+                        args=[corpus.path, die.unique_id, type_record.size_in_bits],
                     )
                 )
 
-            # Here we are supposed to walk member types and calc size with offsets
-            # For now let's assume we can just compare all child sizes
-            # https://github.com/eliben/pyelftools/issues/306#issuecomment-606677552
-            elif "DW_AT_byte_size" not in type_die.attributes:
-                return
+        # Not sure how to parse non complete types
+        # https://stackoverflow.com/questions/38225269/dwarf-reading-not-complete-types
+        elif not type_record.complete:
+            self.gen.fact(
+                AspFunction(
+                    tag + "_non_complete_type",
+                    args=[corpus.path, die.unique_id, "yes"],
+                )
+            )
 
-            else:
-                type_size = type_die.attributes["DW_AT_byte_size"].value * 8
+        # Here we are supposed to walk member types and calc size with offsets
+        # For now let's assume we can just compare all child sizes
+        # https://github.com/eliben/pyelftools/issues/306#issuecomment-606677552
+        elif type_record.size_in_bits is None:
+            return
+
+        else:
+            self.gen.fact(
+                AspFunction(
+                    tag + "_size_in_bits",
+                    args=[corpus.path, die.unique_id, type_record.size_in_bits],
+                )
+            )
+            if type_record.name:
                 self.gen.fact(
                     AspFunction(
-                        tag + "_size_in_bits",
-                        args=[corpus.path, die.unique_id, type_size],
+                        tag + "_type_name",
+                        args=[corpus.path, die.unique_id, type_record.name],
                     )
                 )
-                type_name = None
-                if "DW_AT_linkage_name" in type_die.attributes:
-                    type_name = bytes2str(
-                        type_die.attributes["DW_AT_linkage_name"].value
-                    )
-                elif "DW_AT_name" in type_die.attributes:
-                    type_name = bytes2str(type_die.attributes["DW_AT_name"].value)
-
-                if type_name:
-                    self.gen.fact(
-                        AspFunction(
-                            tag + "_type_name",
-                            args=[corpus.path, die.unique_id, type_name],
-                        )
-                    )
 
     def _parse_compile_unit(self, corpus, die, tag):
         """
@@ -1404,6 +2030,7 @@ class ABICompatSolverSetup(object):
 
             self.gen.fact(fn.corpus(corpus.path))
             self.gen.fact(AspFunction(prefix + "corpus", args=[corpus.path]))
+            self.gen.fact(fn.corpus_id(corpus.path, self._get_corpus_id(corpus)))
             self.gen.fact(
                 AspFunction(
                     prefix + "corpus_name",
@@ -1516,6 +2143,39 @@ class ABICompatSolverSetup(object):
             # section header table index of entry associated with section name string table
             # 'e_shstrndx': 29
 
+    def generate_corpus_facts(self, corpus, prefix=""):
+        """
+        Generate all facts for one corpus, in a role (a prefix of "needed" is
+        the library known to work). If the driver has a fact cache we load
+        them from there, and otherwise generate and save them.
+        """
+        self.gen.h1("Corpus Facts: %s" % corpus.path)
+        cache = self.gen.fact_cache
+        if cache is None:
+            return self._generate_corpus_facts(corpus, prefix)
+
+        role = "-".join(x for x in [prefix or "corpus", self.prune_key] if x)
+        key = cache.get_key(corpus, role, self._get_corpus_id(corpus))
+        facts = cache.load(key)
+        if facts is not None:
+            self.gen.load_facts(facts)
+            return
+
+        # Record the facts as we generate them
+        self.gen.recording = []
+        try:
+            self._generate_corpus_facts(corpus, prefix)
+            cache.save(key, self.gen.recording)
+        finally:
+            self.gen.recording = None
+
+    def _generate_corpus_facts(self, corpus, prefix=""):
+        self.generate_corpus_metadata([corpus], prefix=prefix)
+        if not prefix:
+            self.generate_needed([corpus])
+        self.generate_elf_symbols([corpus], prefix=prefix)
+        self.generate_dwarf_information_entries([corpus], prefix=prefix)
+
     def setup(self, driver, corpora, tests=False):
         """
         Generate an ASP program with relevant constraints for a binary
@@ -1549,6 +2209,21 @@ class ABICompatSolverSetup(object):
         # driver is used by all the functions below to add facts and
         # rules to generate an ASP program.
         self.gen = driver
+        self.gen.schema = self.schema
+
+        # Corpus ids are part of DIE ids, so assign them in a fixed order
+        for corpus in corpora + [library]:
+            self._get_corpus_id(corpus)
+
+        # If we prune DIEs, we need the symbols the binary imports first
+        self.set_relevant_symbols(corpora[0])
+
+        # With a fact cache, we generate (or load) facts one corpus at a time
+        if self.gen.fact_cache is not None:
+            for corpus in corpora:
+                self.generate_corpus_facts(corpus)
+            self.generate_corpus_facts(library, prefix="needed")
+            return
 
         self.gen.h1("Corpus Facts")
 
@@ -1572,58 +2247,219 @@ class ABICompatSolverSetup(object):
         self.generate_dwarf_information_entries([library], prefix="needed")
 
 
-# Internal helper functions
-
-
-def _get_die_filepath(die):
+class CompatSession(object):
     """
-    If we find DW_AT_decl_file in the attributes, we need to get the
-    associated filename.
+    A CompatSession checks many candidate libraries against one binary (and
+    the library known to work with it). The solve driver builds a new control
+    and grounds everything for every query, but here we ground the rules and
+    the facts for the binary and known library once, and then each candidate
+    is added as a small program part (candidate(k) in
+    is_compatible_session.lp) that we turn on and off with an external. So
+    checking N candidates is one base grounding and N small ones.
     """
-    filepath = None
-    if "DW_AT_decl_file" in die.attributes:
-        index = die.attributes["DW_AT_decl_file"].value
 
-        # TODO: need to debug why this fails sometimes
-        try:
-            filepath = get_cu_filename(die.cu, index)
-        except:
-            pass
-    return filepath
+    def __init__(
+        self,
+        binary,
+        library,
+        compact=False,
+        cache_dir=None,
+        logic_programs=None,
+        prune=False,
+        precheck=True,
+    ):
+        """
+        Arguments:
+            binary (str): path to a binary to assess for compataibility
+            library (str): path to a library that is known to work
+            compact (bool): encode corpora, names and DIEs as integers
+            cache_dir (path): cache corpora and their facts in this directory
+            logic_programs (list): logic programs with a base and candidate(k)
+              part (defaults to is_compatible_session.lp)
+            prune (bool): only generate facts for DIEs relevant to the symbols
+              the binary imports
+            precheck (bool): check for missing symbols first, and only
+              generate facts and solve for a candidate if none are missing.
+              A candidate that is missing symbols has no type mismatch atoms
+              in its result (see PrecheckResult).
+        """
+        for path in [binary, library]:
+            if not os.path.exists(path):
+                sys.exit("%s does not exist." % path)
 
+        self.parser = ABIParser(cache_dir)
+        self.setup = ABICompatSolverSetup(compact=compact, prune=prune)
 
-def _get_cu_filename(cu, idx=0):
-    """
-    A DW_AT_decl_file I think can be looked up, by index, from the CU
-    file entry and directory index.
-    """
-    lineprogram = cu.dwarfinfo.line_program_for_CU(cu)
-    cu_filename = bytes2str(lineprogram["file_entry"][idx - 1].name)
-    if len(lineprogram["include_directory"]) > 0:
-        dir_index = lineprogram["file_entry"][idx - 1].dir_index
-        if dir_index > 0:
-            dir_name = bytes2str(lineprogram["include_directory"][dir_index - 1])
-        else:
-            dir_name = "."
-        cu_filename = "%s/%s" % (dir_name, cu_filename)
-    return cu_filename
+        # Candidates are added as facts, so we don't want choice rules
+        self.driver = PyclingoDriver(cores=False, cache_dir=cache_dir)
+        self.driver.control = clingo.Control(["--warn=no-atom-undefined"])
+        self.driver.assumptions = []
+        self.setup.gen = self.driver
+        self.driver.schema = self.setup.schema
+
+        # Lookup of candidate path to the parameter of its program part
+        self.candidates = {}
+        self.timer = Timer()
+
+        logic_programs = logic_programs or ["is_compatible_session.lp"]
+        if not isinstance(logic_programs, list):
+            logic_programs = [logic_programs]
+        parent_dir = os.path.dirname(__file__)
+        for logic_program in logic_programs:
+            self.driver.control.load(os.path.join(parent_dir, logic_program))
+        self.timer.phase("load")
+
+        # Corpus ids are part of DIE ids, so assign them in a fixed order
+        self.binary = self.parser.get_corpus_from_elf(binary)
+        self.library = self.parser.get_corpus_from_elf(library)
+        for corpus in [self.binary, self.library]:
+            self.setup._get_corpus_id(corpus)
+        self.setup.set_relevant_symbols(self.binary)
+
+        self.precheck = None
+        if precheck:
+            self.precheck = SymbolPrecheck(binary, library, self.parser)
+
+        with self.driver.control.backend() as backend:
+            self.driver.backend = backend
+            self.setup.generate_corpus_facts(self.binary)
+            self.setup.generate_corpus_facts(self.library, prefix="needed")
+            self.driver.fact(fn.is_main(self.binary.path))
+            self.driver.fact(fn.is_needed(self.library.path))
+            self.driver.flush()
+        self.timer.phase("setup")
+
+        self.driver.control.ground([("base", [])])
+        self.timer.phase("ground")
+
+    def __str__(self):
+        return "[CompatSession:%s:%s]" % (self.binary.path, len(self.candidates))
+
+    def __repr__(self):
+        return str(self)
+
+    def get_parameter(self, corpus):
+        """
+        The parameter of a candidate part is the candidate corpus, as it
+        appears in the facts (an integer with the compact schema).
+        """
+        if self.setup.schema is not None:
+            return clingo.Number(self.setup.schema.encode_corpus(corpus.path))
+        return clingo.String(corpus.path)
+
+    def add_candidate(self, path):
+        """
+        Generate the facts for a candidate library and ground its part.
+        """
+        if path in self.candidates:
+            return self.candidates[path]
+        if not os.path.exists(path):
+            sys.exit("%s does not exist." % path)
+
+        corpus = self.parser.get_corpus_from_elf(path)
+        with self.driver.control.backend() as backend:
+            self.driver.backend = backend
+            self.setup.generate_corpus_facts(corpus)
+            self.driver.flush()
+        self.timer.phase("setup %s" % path)
+
+        parameter = self.get_parameter(corpus)
+        self.driver.control.ground([("candidate", [parameter])])
+        self.timer.phase("ground %s" % path)
+        self.candidates[path] = parameter
+        return parameter
+
+    def remove_candidate(self, path):
+        """
+        Retract a candidate for good (its atoms are false from now on).
+        """
+        parameter = self.candidates.pop(path, None)
+        if parameter is not None:
+            active = clingo.Function("active", [parameter])
+            self.driver.control.release_external(active)
+
+    def check(self, path):
+        """
+        Check one candidate library (adding it if we haven't seen it) with
+        only its part active, and return a Result. The answers are the shown
+        atoms, as (name, args) with the compact schema decoded. If the
+        precheck finds missing symbols, we return its result instead.
+        """
+        if self.precheck is not None:
+            result = self.precheck.check(path)
+            self.timer.phase("precheck %s" % path)
+            if result.decided:
+                return result
+
+        parameter = self.add_candidate(path)
+        for other in self.candidates.values():
+            self.driver.control.assign_external(
+                clingo.Function("active", [other]), other == parameter
+            )
+
+        result = Result()
+        schema = self.setup.schema
+
+        def stringify(x):
+            return x.string if x.type == clingo.SymbolType.String else str(x)
+
+        def on_model(model):
+            result.nmodels += 1
+            symbols = model.symbols(shown=True)
+            if schema is not None:
+                symbols = [schema.decode(symbol) for symbol in symbols]
+            result.answers = sorted(
+                (sym.name, [stringify(a) for a in sym.arguments]) for sym in symbols
+            )
+
+        solve_result = self.driver.control.solve(on_model=on_model)
+        self.timer.phase("solve %s" % path)
+        result.satisfiable = solve_result.satisfiable
+        return result
+
+    def is_compatible(self, path):
+        """
+        Shortcut to check a candidate and return True or False.
+        """
+        result = self.check(path)
+        return any(name == "are_compatible" for name, _ in result.answers)
+
+    def close(self):
+        self.driver.close()
+        self.parser.close()
 
 
 # Functions intended to be called by external clients
 
 
-def generate_facts(libs):
-    """A single function to print facts for one or more corpora."""
+def generate_facts(libs, out=None, compact=False, cache_dir=None, prune=False):
+    """A single function to print facts for one or more corpora.
+
+    Arguments:
+        libs (list): paths to the binary, known to work and unknown libraries
+        out (file-like or FactSink): where to write the facts, defaults to
+          sys.stdout (e.g., a CompressedFileSink to write them to a .lp.gz)
+        compact (bool): encode corpora, names and DIEs as integers
+        cache_dir (path): cache corpora and their facts in this directory
+        prune (bool): only generate facts for DIEs relevant to the symbols
+          the binary imports
+    """
     if not isinstance(libs, list):
         libs = [libs]
+    if out is None:
+        out = sys.stdout
 
-    parser = ABIParser()
-    setup = ABICompatSolverSetup()
-    driver = PyclingoDriver()
+    parser = ABIParser(cache_dir)
+    setup = ABICompatSolverSetup(compact=compact, prune=prune)
+    driver = PyclingoDriver(asp=out, cache_dir=cache_dir)
     corpora = []
     for lib in libs:
         corpora.append(parser.get_corpus_from_elf(lib))
-    return driver.solve(setup, corpora, facts_only=True)
+    try:
+        return driver.solve(setup, corpora, facts_only=True)
+    finally:
+        driver.close()
+        parser.close()
 
 
 def is_compatible(
@@ -1636,6 +2472,10 @@ def is_compatible(
     stats=False,
     tests=False,
     logic_programs=None,
+    compact=False,
+    cache_dir=None,
+    prune=False,
+    precheck=False,
 ):
     """
     Given three libraries (we call one a main binary and the other a library
@@ -1652,21 +2492,37 @@ def is_compatible(
         libraryB (str): a second library to assess for compatability.
         dump (tuple): what to dump
         models (int): number of models to search (default: 0)
+        compact (bool): encode corpora, names and DIEs as integers
+        cache_dir (path): cache corpora and their facts in this directory
+        prune (bool): only generate facts for DIEs relevant to the symbols
+          the binary imports
+        precheck (bool): check for missing symbols first, and return that
+          result (a PrecheckResult) without solving if any are missing
+          (default: False). Its answers are the atoms of the session schema
+          (is_compatible_session.lp), not those is_compatible.lp shows, and
+          it doesn't have the type mismatch atoms the solver would show.
     """
-    driver = PyclingoDriver()
+    driver = PyclingoDriver(cache_dir=cache_dir)
     if "asp" in dump:
         driver.out = sys.stdout
 
-    for path in [binary, library]:
+    for path in [binary, libraryA, libraryB]:
         if not os.path.exists(path):
             sys.exit("%s does not exist." % path)
 
     # Create the parser, and generate the corpora
-    parser = ABIParser()
+    parser = ABIParser(cache_dir)
+
+    # Missing symbols are decided without the solver
+    if precheck:
+        result = SymbolPrecheck(binary, libraryA, parser).check(libraryB)
+        if result.decided:
+            return result
+
     corpusA = parser.get_corpus_from_elf(binary)
     corpusB = parser.get_corpus_from_elf(libraryA)
     corpusC = parser.get_corpus_from_elf(libraryB)
-    setup = ABICompatSolverSetup()
+    setup = ABICompatSolverSetup(compact=compact, prune=prune)
 
     # The order should be binary | working library | library
     return driver.solve(
@@ -1679,3 +2535,133 @@ def is_compatible(
         tests,
         logic_programs,
     )
+
+
+# One CompatSession per binary (and known library) in each matrix worker
+_matrix_sessions = {}
+_matrix_options = {}
+
+
+def _init_matrix_worker(options):
+    """A forked worker shouldn't share the parent's open handles"""
+    elf_handles.close_all()
+    _matrix_sessions.clear()
+    _matrix_options.update(options)
+
+    # A pool worker doesn't run atexit, but does run finalizers on exit
+    multiprocessing.util.Finalize(None, _close_matrix_sessions, exitpriority=10)
+
+
+def _close_matrix_sessions():
+    """Close the sessions this process made for the matrix"""
+    for session in _matrix_sessions.values():
+        session.close()
+    _matrix_sessions.clear()
+
+
+def _check_matrix_pair(binary, library, candidate):
+    """Check one pair of the matrix, reusing the session for the binary"""
+    start = time.time()
+    session = _matrix_sessions.get((binary, library))
+    if session is None:
+        session = CompatSession(binary, library, **_matrix_options)
+        _matrix_sessions[(binary, library)] = session
+    result = session.check(candidate)
+    return binary, candidate, result, time.time() - start
+
+
+def is_compatible_matrix(
+    binaries,
+    known_good,
+    candidates,
+    workers=None,
+    compact=False,
+    cache_dir=None,
+    prune=False,
+    timers=False,
+):
+    """
+    Check every binary against every candidate library, and yield
+    (binary, candidate, result, seconds) for each pair as it finishes. Each
+    distinct file is parsed once up front (forked workers share the corpora)
+    and each worker keeps a CompatSession per binary, so the binary is only
+    grounded once per worker, no matter how many candidates it checks.
+
+    Arguments:
+        binaries (list): paths to binaries to assess for compatibility
+        known_good (str or dict): a library known to work with every binary,
+          or a lookup of binary path to the library known to work with it
+        candidates (list): paths to libraries to assess for compatibility
+        workers (int): processes to check pairs with (defaults to the number
+          of CPUs, and 1 checks them in this process)
+        compact (bool): encode corpora, names and DIEs as integers
+        cache_dir (path): cache corpora and their facts in this directory
+        prune (bool): only generate facts for DIEs relevant to the symbols
+          each binary imports
+        timers (bool): print the throughput and per pair latency at the end
+    """
+    binaries = list(binaries)
+    candidates = list(candidates)
+    if not isinstance(known_good, dict):
+        known_good = dict((binary, known_good) for binary in binaries)
+
+    paths = set(binaries) | set(candidates)
+    paths |= set(known_good[binary] for binary in binaries)
+    for path in paths:
+        if not os.path.exists(path):
+            sys.exit("%s does not exist." % path)
+
+    # Parse each distinct file once
+    parser = ABIParser(cache_dir)
+    try:
+        for path in sorted(paths):
+            parser.get_corpus_from_elf(path)
+
+        options = {"compact": compact, "cache_dir": cache_dir, "prune": prune}
+        pairs = [
+            (binary, known_good[binary], candidate)
+            for binary in binaries
+            for candidate in candidates
+        ]
+        workers = min(workers or os.cpu_count() or 1, len(pairs))
+
+        latencies = []
+        start = time.time()
+        if workers <= 1:
+            _matrix_sessions.clear()
+            _matrix_options.clear()
+            _matrix_options.update(options)
+            try:
+                for pair in pairs:
+                    binary, candidate, result, seconds = _check_matrix_pair(*pair)
+                    latencies.append(seconds)
+                    yield binary, candidate, result, seconds
+            finally:
+                _close_matrix_sessions()
+        else:
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_matrix_worker,
+                initargs=(options,),
+            ) as executor:
+                futures = [
+                    executor.submit(_check_matrix_pair, *pair) for pair in pairs
+                ]
+                for future in as_completed(futures):
+                    binary, candidate, result, seconds = future.result()
+                    latencies.append(seconds)
+                    yield binary, candidate, result, seconds
+    finally:
+        parser.close()
+
+    if timers and latencies:
+        seconds = time.time() - start
+        latencies.sort()
+        print(
+            "Checked %s pairs in %.4fs (%.1f pairs/second) with %s workers"
+            % (len(latencies), seconds, len(latencies) / seconds, workers)
+        )
+        print(
+            "Latency per pair: min %.4fs, median %.4fs, max %.4fs"
+            % (latencies[0], latencies[len(latencies) // 2], latencies[-1])
+        )
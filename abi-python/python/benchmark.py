@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# Benchmark how fast we can emit facts (facts/second) to the solver backend,
+# with the driver configured the way it used to work (render every fact to
+# text and add it to the backend one at a time) and with the fact sinks,
+# batching and symbol interning. We also show the interning hit rate.
+#
+# python benchmark.py <binary> <library-known-to-work> <library-to-test>
+
+import os
+import sys
+import tempfile
+import time
+
+import clingo
+
+from asp import (
+    ABICompatSolverSetup,
+    ABIParser,
+    BufferSink,
+    CompressedFileSink,
+    NullSink,
+    PyclingoDriver,
+    SymbolInterner,
+)
+
+
+def emit_facts(driver, corpora):
+    """Run the setup (fact generation) only, and return facts / seconds"""
+    driver.control = clingo.Control()
+    driver.assumptions = []
+    driver.facts = []
+    driver.nfacts = 0
+    driver.symbols = SymbolInterner()
+    start = time.time()
+    with driver.control.backend() as backend:
+        driver.backend = backend
+        ABICompatSolverSetup().setup(driver, corpora)
+        driver.flush()
+    seconds = time.time() - start
+    driver.close()
+    return driver.nfacts, seconds
+
+
+def main():
+    libs = sys.argv[1:4]
+    if len(libs) != 3:
+        sys.exit("Usage: benchmark.py <binary> <library-known> <library-test>")
+
+    # Parse the corpora once, we only want to time emitting the facts
+    parser = ABIParser()
+    corpora = [parser.get_corpus_from_elf(lib) for lib in libs]
+    tmpdir = tempfile.mkdtemp()
+
+    # The first pass over the DIEs is slower (pyelftools caches them)
+    emit_facts(PyclingoDriver(), corpora)
+
+    runs = [
+        ("before: text, one at a time", lambda: (open(os.devnull, "w"), 1, False)),
+        ("null sink, batched", lambda: (NullSink(), 10000, False)),
+        ("null sink, batched, interned", lambda: (NullSink(), 10000, True)),
+        ("buffer sink, batched, interned", lambda: (BufferSink(), 10000, True)),
+        (
+            "compressed sink, batched, interned",
+            lambda: (
+                CompressedFileSink(os.path.join(tmpdir, "facts.lp.gz")),
+                10000,
+                True,
+            ),
+        ),
+    ]
+    for name, get_config in runs:
+        out, batch_size, intern = get_config()
+        driver = PyclingoDriver(asp=out, batch_size=batch_size, intern=intern)
+        nfacts, seconds = emit_facts(driver, corpora)
+        print(
+            "%-36s %8d facts %8.3fs %10.0f facts/second %6.1f%% interned"
+            % (
+                name,
+                nfacts,
+                seconds,
+                nfacts / seconds,
+                driver.symbols.stats["hit_rate"] * 100,
+            )
+        )
+    parser.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# Benchmark reading compressed (gzip, xz, bz2) ELF files directly, compared to
+# the old workflow of decompressing each one to a temporary file first. For
+# libraries with compressed debug sections (gcc -gz) we also show a second read
+# that gets the decompressed sections from the section cache.
+#
+# python benchmark_compressed.py <compressed-elf> [<compressed-elf> ...]
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from corpus import ABIParser, get_decompressor, section_cache
+
+
+def read_corpus(filename):
+    """Parse a corpus (with DWARF entries) and return seconds"""
+    start = time.time()
+    parser = ABIParser()
+    parser.get_corpus_from_elf(
+        filename, include_dwarf_entries=True, load_needed_libs=False
+    )
+    parser.close()
+    return time.time() - start
+
+
+def read_with_tempfile(filename):
+    """Decompress to a temporary file, parse it, and return seconds"""
+    start = time.time()
+    with open(filename, "rb") as fd:
+        opener = get_decompressor(fd)
+        if not opener:
+            sys.exit("%s is not compressed." % filename)
+        with opener(fd) as stream, tempfile.NamedTemporaryFile(
+            suffix=".so"
+        ) as tmp:
+            shutil.copyfileobj(stream, tmp)
+            tmp.flush()
+            read_corpus(tmp.name)
+    return time.time() - start
+
+
+def read_direct(filename, clear=True):
+    """Parse the compressed file directly, and return seconds"""
+    if clear:
+        section_cache.clear()
+    return read_corpus(filename)
+
+
+def main():
+    libs = sys.argv[1:]
+    if not libs:
+        sys.exit("Usage: benchmark_compressed.py <compressed-elf> ...")
+
+    runs = [
+        ("before: temporary file", read_with_tempfile),
+        ("direct", read_direct),
+        ("direct, sections cached", lambda x: read_direct(x, clear=False)),
+    ]
+    for lib in libs:
+        print("%s (%d bytes)" % (lib, os.path.getsize(lib)))
+        for name, func in runs:
+            seconds = min(func(lib) for _ in range(5))
+            print("  %-32s %8.4fs" % (name, seconds))
+    print("section cache: %s" % section_cache.stats)
+
+
+if __name__ == "__main__":
+    main()
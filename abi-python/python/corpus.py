@@ -9,9 +9,29 @@ import elftools.construct.macros as macros
 from elftools.elf.elffile import ELFFile, ELFError, NullSection
 from elftools.elf.dynamic import DynamicSection, DynamicSegment
 from elftools.common.py3compat import bytes2str
+from array import array
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+import glob
+import atexit
+import bz2
+import collections
+import gzip
+import hashlib
+import lzma
+import mmap
+import pickle
+import struct
+import tempfile
 import sys
 import enum
 import os
+import threading
 
 from elftools.elf.sections import (
     NoteSection,
@@ -24,7 +44,14 @@ from elftools.elf.gnuversions import (
     GNUVerNeedSection,
 )
 
-from elftools.elf.constants import SHN_INDICES
+from elftools.elf.constants import SHN_INDICES, SH_FLAGS
+from elftools.elf.enums import (
+    ENUM_SH_TYPE_BASE,
+    ENUM_ST_INFO_TYPE,
+    ENUM_ST_INFO_BIND,
+    ENUM_ST_VISIBILITY,
+    ENUM_ST_SHNDX,
+)
 from elftools.elf.relocation import RelocationSection
 
 from elftools.dwarf.descriptions import describe_attr_value
@@ -38,24 +65,660 @@ from elftools.elf.descriptions import (
 
 __version__ = "1.0"
 
+# The layout of a CorpusCache entry. Bump this whenever what we pickle changes
+# (e.g., the SymbolTable or abi-instr entries), so old entries are misses.
+CACHE_FORMAT_VERSION = 2
 
-class CorpusReader(ELFFile):
-    """A CorpusReader wraps an elffile, allowing us to easily open/close
-    and keep the stream open while we are interacting with content. We close
-    the file handle on any exit.
+
+# The magic bytes of compressed files that we can read directly
+compression_magic = [
+    (b"\x1f\x8b", gzip.open),
+    (b"\xfd7zXZ\x00", lzma.open),
+    (b"BZh", bz2.open),
+]
+
+
+def get_decompressor(fd):
+    """Sniff the magic bytes of an open (binary) file, and return the function
+    to open it as a decompressed stream, or None if it isn't compressed.
+    """
+    position = fd.tell()
+    magic = fd.read(6)
+    fd.seek(position)
+    for prefix, opener in compression_magic:
+        if magic.startswith(prefix):
+            return opener
+
+
+def decompress_to_map(fd, opener, chunk_size=1024 * 1024):
+    """Decompress a stream into an anonymous memory map. pyelftools seeks all
+    over an ELF file, so we can't give it the compressed stream, but this way
+    we don't need to write (and read back) a temporary file either.
+    """
+    data = mmap.mmap(-1, chunk_size)
+    with opener(fd) as stream:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            end = data.tell() + len(chunk)
+            if end > len(data):
+                data.resize(max(end, len(data) * 2))
+            data.write(chunk)
+    if data.tell():
+        data.resize(data.tell())
+    data.seek(0)
+    return data
+
+
+class SectionCache:
+    """A SectionCache holds the decompressed data of SHF_COMPRESSED sections
+    (e.g., .debug_info from gcc -gz), keyed on the file (path, inode, mtime)
+    and section name. pyelftools inflates a compressed section each time it
+    is read, and a handle is opened again after its last user releases it, so
+    this way we only decompress a section once. It's bounded in size, and
+    evicts the least recently used sections first.
     """
 
-    def __init__(self, filename):
-        self.fd = open(filename, "rb")
+    def __init__(self, max_size=256 * 1024 * 1024):
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._sections = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __str__(self):
+        return "[SectionCache:%s]" % len(self._sections)
+
+    def __repr__(self):
+        return str(self)
+
+    @property
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": self.size,
+        }
+
+    def get(self, key, section):
+        """Get the decompressed data for a section, decompressing on a miss"""
+        name = (key, section.name)
+        with self._lock:
+            data = self._sections.get(name)
+            if data is not None:
+                self._sections.move_to_end(name)
+                self.hits += 1
+                return data
+
+        data = section.data()
+        with self._lock:
+            self.misses += 1
+            if len(data) > self.max_size or name in self._sections:
+                return data
+            self._sections[name] = data
+            self.size += len(data)
+            while self.size > self.max_size:
+                _, evicted = self._sections.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+        return data
+
+    def clear(self):
+        with self._lock:
+            self._sections = collections.OrderedDict()
+            self.size = 0
+
+
+section_cache = SectionCache()
+
+
+class CachedELFFile(ELFFile):
+    """An ELFFile that reads compressed DWARF sections from the section_cache,
+    so each one is only decompressed once. _read_dwarf_section is private to
+    pyelftools (requirements.txt pins the version we know), so we pass its
+    arguments through as is. If ELFFile doesn't call it, pyelftools just
+    decompresses the sections itself.
+    """
+
+    def __init__(self, stream, key):
+        super().__init__(stream)
+        self.key = key
+
+    def _read_dwarf_section(self, section, *args, **kwargs):
+        if getattr(section, "compressed", False):
+            data = section_cache.get(self.key, section)
+            section.data = lambda: data
+        return super()._read_dwarf_section(section, *args, **kwargs)
+
+
+class ElfHandle:
+    """An ElfHandle holds the one open file descriptor and memory map for an
+    ELF file, along with the ELFFile (and DWARF info) parsed from it. Handles
+    are handed out by the ElfHandleRegistry and reference counted, so the
+    CorpusReader, Corpus and ABIParser can share the same one. A compressed
+    (gzip, xz or bz2) file is decompressed into an anonymous memory map.
+    """
+
+    def __init__(self, filename, key):
         self.filename = filename
+        self.key = key
+        self.refcount = 0
+        self._dwarfinfo = None
+        self.fd = open(filename, "rb")
         try:
-            self.elffile = ELFFile(self.fd)
+            opener = get_decompressor(self.fd)
+            self.compressed = opener is not None
+            if self.compressed:
+                self.map = decompress_to_map(self.fd, opener)
+            else:
+                self.map = mmap.mmap(self.fd.fileno(), 0, access=mmap.ACCESS_READ)
+            self.elffile = CachedELFFile(self.map, key)
         except:
+            self.close()
             sys.exit("%s is not an ELF file." % filename)
 
-        # Cannot continue without dwarf info
-        if not self.elffile.has_dwarf_info():
+    def __str__(self):
+        return "[ElfHandle:%s]" % self.filename
+
+    def __repr__(self):
+        return str(self)
+
+    @property
+    def closed(self):
+        return self.fd is None
+
+    @property
+    def dwarfinfo(self):
+        """Parse the DWARF info once, and keep it for the life of the handle"""
+        if self._dwarfinfo is None:
+            self._dwarfinfo = self.elffile.get_dwarf_info()
+        return self._dwarfinfo
+
+    def close(self):
+        self._dwarfinfo = None
+        self.elffile = None
+        if getattr(self, "map", None) is not None:
+            self.map.close()
+            self.map = None
+        if self.fd is not None:
+            self.fd.close()
+            self.fd = None
+
+
+class ElfHandleRegistry:
+    """The ElfHandleRegistry keeps one ElfHandle per ELF file, keyed on the
+    (path, inode, mtime) of the file so a file that changes on disk gets
+    a fresh handle. Handles are closed when their last user releases them,
+    and anything left open is closed on exit.
+    """
+
+    def __init__(self):
+        self._handles = {}
+        self._lock = threading.Lock()
+
+    def __str__(self):
+        return "[ElfHandleRegistry:%s]" % len(self._handles)
+
+    def __repr__(self):
+        return str(self)
+
+    def __len__(self):
+        return len(self._handles)
+
+    def get_key(self, filename):
+        """Derive the registry key for a file, (path, inode, mtime)"""
+        filename = os.path.abspath(filename)
+        st = os.stat(filename)
+        return (filename, st.st_ino, st.st_mtime_ns)
+
+    def acquire(self, filename):
+        """Get a handle for a filename (opening it if needed) and add a
+        reference to it. Every acquire should be paired with a release.
+        """
+        if not os.path.exists(filename):
+            sys.exit("%s does not exist." % filename)
+        key = self.get_key(filename)
+        with self._lock:
+            handle = self._handles.get(key[0])
+
+            # The file changed on disk, the old handle is stale. Its users can
+            # still be reading it, so the last release closes it (not us)
+            if handle and handle.key != key:
+                handle = None
+            if not handle:
+                handle = ElfHandle(key[0], key)
+                self._handles[key[0]] = handle
+            handle.refcount += 1
+        return handle
+
+    def get(self, filename):
+        """Get the open handle for a filename without adding a reference, or
+        None if there isn't one (or it's stale).
+        """
+        key = self.get_key(filename)
+        with self._lock:
+            handle = self._handles.get(key[0])
+            if handle and handle.key == key:
+                return handle
+
+    def release(self, handle):
+        """Drop a reference to a handle, closing it if it's the last one"""
+        with self._lock:
+            handle.refcount -= 1
+            if handle.refcount > 0:
+                return
+            handle.close()
+            if self._handles.get(handle.filename) is handle:
+                del self._handles[handle.filename]
+
+    def close_all(self):
+        with self._lock:
+            for handle in self._handles.values():
+                handle.close()
+            self._handles = {}
+
+
+# One registry per process, shared by every reader and corpus
+elf_handles = ElfHandleRegistry()
+atexit.register(elf_handles.close_all)
+
+
+def _reverse_enum(enum):
+    """Map the integer values of a pyelftools enum back to names. Like the
+    construct Enum, if two names share a value the last one wins.
+    """
+    return dict((v, k) for k, v in enum.items() if k != "_default_")
+
+
+_ST_INFO_TYPE_NAMES = _reverse_enum(ENUM_ST_INFO_TYPE)
+_ST_INFO_BIND_NAMES = _reverse_enum(ENUM_ST_INFO_BIND)
+_ST_VISIBILITY_NAMES = _reverse_enum(ENUM_ST_VISIBILITY)
+_ST_SHNDX_NAMES = _reverse_enum(ENUM_ST_SHNDX)
+_SHN_UNDEF = ENUM_ST_SHNDX["SHN_UNDEF"]
+_STB_LOCAL = ENUM_ST_INFO_BIND["STB_LOCAL"]
+_STB_WEAK = ENUM_ST_INFO_BIND["STB_WEAK"]
+
+# Section header types (sh_type) we look sections up by
+SHT_SYMTAB = 2
+SHT_DYNAMIC = 6
+SHT_DYNSYM = 11
+SHT_SYMTAB_SHNDX = 18
+SHT_GNU_VERDEF = 0x6FFFFFFD
+SHT_GNU_VERNEED = 0x6FFFFFFE
+SHT_GNU_VERSYM = 0x6FFFFFFF
+
+
+def _enum_code(value, enum):
+    """pyelftools gives us names for known values and ints otherwise"""
+    if isinstance(value, int):
+        return value
+    return enum[value]
+
+
+class SymbolTable:
+    """A SymbolTable holds the elf symbols for a corpus in parallel arrays,
+    one row per unique symbol name. Names are stored as offsets into a
+    single NUL separated string blob, and type, binding, visibility, section
+    index (defined) and version are small integer codes. We only build the
+    readelf style strings (e.g., "FUNC", "GLOBAL", "UND") when asked for.
+
+    The table behaves like the dict of dicts we used to build, so
+    corpus.elfsymbols[name]["type"] and corpus.elfsymbols.items() still work,
+    and keys() is a set-like view for comparing two corpora.
+    """
+
+    def __init__(self):
+        self.strings = bytearray()
+        self.name_offsets = array("I")
+        self.types = array("B")
+        self.bindings = array("B")
+        self.visibilities = array("B")
+        self.shndx = array("I")
+        self.versions = array("H")
+
+        # Version strings are interned, 0 is always no version
+        self.version_strings = [""]
+        self._version_index = {"": 0}
+
+        # Lookup of symbol name to row
+        self.index = {}
+
+    def __str__(self):
+        return "[SymbolTable:%s]" % len(self)
+
+    def __repr__(self):
+        return str(self)
+
+    def __len__(self):
+        return len(self.name_offsets)
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __getitem__(self, name):
+        return self.describe(self.index[name])
+
+    def get(self, name, default=None):
+        row = self.index.get(name)
+        if row is None:
+            return default
+        return self.describe(row)
+
+    def keys(self):
+        return self.index.keys()
+
+    def items(self):
+        for name, row in self.index.items():
+            yield name, self.describe(row)
+
+    def values(self):
+        for row in self.index.values():
+            yield self.describe(row)
+
+    def __getstate__(self):
+        """The name and version lookups can be rebuilt, so we don't save them"""
+        state = dict(self.__dict__)
+        del state["index"]
+        del state["_version_index"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        names = bytes(self.strings).split(b"\0")[:-1]
+        self.index = dict((name.decode("utf-8"), row) for row, name in enumerate(names))
+        self._version_index = dict(
+            (version, index) for index, version in enumerate(self.version_strings)
+        )
+
+    def add(self, name, stype, binding, visibility, shndx, version_info=""):
+        """Add a symbol by its integer codes. As with a dict, a symbol that
+        is seen again (e.g., in .symtab after .dynsym) replaces the first.
+        """
+        version = self._version_index.get(version_info)
+        if version is None:
+            version = len(self.version_strings)
+            self.version_strings.append(version_info)
+            self._version_index[version_info] = version
+
+        row = self.index.get(name)
+        if row is None:
+            row = len(self.name_offsets)
+            self.index[name] = row
+            self.name_offsets.append(len(self.strings))
+            self.strings += name.encode("utf-8") + b"\0"
+            self.types.append(stype)
+            self.bindings.append(binding)
+            self.visibilities.append(visibility)
+            self.shndx.append(shndx)
+            self.versions.append(version)
+            return row
+
+        self.types[row] = stype
+        self.bindings[row] = binding
+        self.visibilities[row] = visibility
+        self.shndx[row] = shndx
+        self.versions[row] = version
+        return row
+
+    def get_name(self, row):
+        start = self.name_offsets[row]
+        end = self.strings.index(b"\0", start)
+        return self.strings[start:end].decode("utf-8")
+
+    def get_type(self, row):
+        code = self.types[row]
+        return describe_symbol_type(_ST_INFO_TYPE_NAMES.get(code, code))
+
+    def get_binding(self, row):
+        code = self.bindings[row]
+        return describe_symbol_bind(_ST_INFO_BIND_NAMES.get(code, code))
+
+    def get_visibility(self, row):
+        code = self.visibilities[row]
+        return describe_symbol_visibility(_ST_VISIBILITY_NAMES.get(code, code))
+
+    def get_defined(self, row):
+        code = self.shndx[row]
+        return describe_symbol_shndx(_ST_SHNDX_NAMES.get(code, code)).strip()
+
+    def get_version(self, row):
+        return self.version_strings[self.versions[row]]
+
+    def is_defined(self, row):
+        return self.shndx[row] != _SHN_UNDEF
+
+    def describe(self, row):
+        """Materialize the dict for one row, the same we used to store"""
+        return {
+            "version_info": self.get_version(row),
+            "type": self.get_type(row),
+            "binding": self.get_binding(row),
+            "visibility": self.get_visibility(row),
+            "defined": self.get_defined(row),
+        }
+
+    def defined_names(self):
+        """The set of symbol names that are defined in this corpus"""
+        shndx = self.shndx
+        return set(
+            name for name, row in self.index.items() if shndx[row] != _SHN_UNDEF
+        )
+
+    def undefined_names(self):
+        """The set of symbol names that are undefined in this corpus"""
+        shndx = self.shndx
+        return set(
+            name for name, row in self.index.items() if shndx[row] == _SHN_UNDEF
+        )
+
+    def exported_names(self):
+        """The symbol names this corpus can provide to others (defined and
+        not local), the same that the dynamic linker would bind to.
+        """
+        shndx = self.shndx
+        bindings = self.bindings
+        return [
+            name
+            for name, row in self.index.items()
+            if shndx[row] != _SHN_UNDEF and bindings[row] != _STB_LOCAL
+        ]
+
+
+def get_build_id(elffile):
+    """Get the GNU build-id of an ELF file (a hex string) or None"""
+    section = elffile.get_section_by_name(".note.gnu.build-id")
+    if not isinstance(section, NoteSection):
+        return None
+    for note in section.iter_notes():
+        if note["n_type"] == "NT_GNU_BUILD_ID":
+            return note["n_desc"]
+
+
+# Content ids we've already computed, keyed by the ELF handle registry key
+_content_ids = {}
+
+
+def get_content_id(filename):
+    """Get an id for the content of an ELF file, the GNU build-id if there
+    is one, and otherwise the sha256 of the file. We only compute it once
+    for a file that hasn't changed on disk.
+    """
+    key = elf_handles.get_key(filename)
+    if key not in _content_ids:
+        _content_ids[key] = _get_content_id(filename)
+    return _content_ids[key]
+
+
+def _get_content_id(filename):
+    handle = elf_handles.acquire(filename)
+    try:
+        identifier = get_build_id(handle.elffile)
+        if not identifier:
+            identifier = "sha256-" + hashlib.sha256(handle.map).hexdigest()
+    finally:
+        elf_handles.release(handle)
+    return identifier
+
+
+class CorpusCache:
+    """A CorpusCache is an opt-in directory of serialized corpora, so that
+    libraries that don't change (e.g., system libraries between CI runs)
+    don't need to be parsed again. An entry holds the ELF header, dynamic
+    tags, symbol table (with version info) and optionally the parsed DWARF
+    entries. Entries are keyed by the GNU build-id (or a content hash if
+    there isn't one) and CACHE_FORMAT_VERSION. The directory is
+    bounded in size, evicting the least recently used entries first.
+    """
+
+    def __init__(self, cache_dir, max_size=512 * 1024 * 1024):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def __str__(self):
+        return "[CorpusCache:%s]" % self.cache_dir
+
+    def __repr__(self):
+        return str(self)
+
+    @property
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    def get_key(self, filename, include_dwarf_entries=False, symbols_only=False):
+        """The key is the build-id (or sha256 of the content) plus the cache
+        format version, and if the entry includes dwarf entries or only symbols.
+        """
+        key = "%s-%s" % (get_content_id(filename), CACHE_FORMAT_VERSION)
+        if symbols_only:
+            key += "-symbols"
+        elif include_dwarf_entries:
+            key += "-dwarf"
+        return key
+
+    def get_path(self, key):
+        return os.path.join(self.cache_dir, key + ".corpus")
+
+    def load(self, corpus, include_dwarf_entries=False, symbols_only=False):
+        """Load a cached corpus into a Corpus, returning True on a hit"""
+        key = self.get_key(corpus.path, include_dwarf_entries, symbols_only)
+        path = self.get_path(key)
+        attrs = [
+            "elfheader",
+            "dynamic_tags",
+            "architecture",
+            "elfclass",
+            "elfsymbols",
+            "abi_instr",
+        ]
+
+        # An entry from another version of this code might not unpickle
+        try:
+            with open(path, "rb") as fd:
+                data = pickle.load(fd)
+        except (
+            OSError,
+            EOFError,
+            pickle.UnpicklingError,
+            AttributeError,
+            ImportError,
+            IndexError,
+            TypeError,
+            ValueError,
+        ):
+            data = None
+        if not isinstance(data, dict) or any(attr not in data for attr in attrs):
+            self.misses += 1
+            return False
+
+        for attr in attrs:
+            setattr(corpus, attr, data[attr])
+
+        # Mark the entry as recently used
+        os.utime(path)
+        self.hits += 1
+        return True
+
+    def save(self, corpus, include_dwarf_entries=False, symbols_only=False):
+        """Save a corpus to the cache, and evict old entries if needed"""
+        key = self.get_key(corpus.path, include_dwarf_entries, symbols_only)
+        path = self.get_path(key)
+        data = {
+            "elfheader": corpus.elfheader,
+            "dynamic_tags": corpus.dynamic_tags,
+            "architecture": corpus.architecture,
+            "elfclass": corpus.elfclass,
+            "elfsymbols": corpus.elfsymbols,
+            "abi_instr": corpus.abi_instr if include_dwarf_entries else [],
+        }
+
+        # Write to a temporary file first so readers never see half an entry
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as out:
+            pickle.dump(data, out, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        self.evict()
+        return path
+
+    def evict(self):
+        """Remove least recently used entries until we are under max_size"""
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".corpus"):
+                continue
+            st = os.stat(os.path.join(self.cache_dir, name))
+            entries.append((st.st_mtime, st.st_size, name))
+            total += st.st_size
+
+        for _, size, name in sorted(entries):
+            if total <= self.max_size:
+                break
+            os.remove(os.path.join(self.cache_dir, name))
+            total -= size
+            self.evictions += 1
+
+    def clear(self):
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".corpus"):
+                os.remove(os.path.join(self.cache_dir, name))
+
+
+class CorpusReader(ELFFile):
+    """A CorpusReader wraps an elffile, allowing us to easily open/close
+    and keep the stream open while we are interacting with content. The
+    underlying file and memory map come from the shared ElfHandleRegistry,
+    and are released when the reader is closed (or used as a context manager).
+    """
+
+    def __init__(self, filename, symbols_only=False):
+        """
+        Arguments:
+            filename (path): the ELF file to read
+            symbols_only (bool): only read the dynamic symbols, dynamic
+              section and version sections. This works without DWARF
+              (e.g., on stripped libraries) and never reads .debug_*
+        """
+        self.handle = elf_handles.acquire(filename)
+        self.filename = self.handle.filename
+        self.elffile = self.handle.elffile
+        self.symbols_only = symbols_only
+
+        # Cannot continue without dwarf info (unless we only want symbols)
+        if not symbols_only and not self.elffile.has_dwarf_info():
+            self.close()
             sys.exit("%s is missing DWARF info." % self.filename)
+        self.get_section_index()
         self.get_version_lookup()
         self.get_shndx_sections()
 
@@ -69,9 +732,18 @@ class CorpusReader(ELFFile):
     def header(self):
         return dict(self.elffile.header)
 
-    def __exit__(self):
-        print("Closing reader")
-        self.fd.close()
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Release our reference to the shared handle (only once)"""
+        if self.handle is not None:
+            elf_handles.release(self.handle)
+            self.handle = None
+            self.elffile = None
 
     def get_architecture(self):
         return self.elffile.header.get("e_machine")
@@ -79,6 +751,60 @@ class CorpusReader(ELFFile):
     def get_elf_class(self):
         return self.elffile.elfclass
 
+    def get_section_index(self):
+        """Read the section header table once, in bulk, into a lookup of
+        section type (sh_type) to section indices (in section order) and
+        of section name to index. Everything else finds sections here, so we
+        only ever create the pyelftools Section objects that we need.
+        """
+        self._section_types = {}
+        self._section_names = {}
+
+        header = self.elffile.header
+        count = self.elffile.num_sections()
+        order = "<" if self.elffile.little_endian else ">"
+        if self.elffile.elfclass == 32:
+            fmt = order + "IIIIIIIIII"
+        else:
+            fmt = order + "IIQQQQIIQQ"
+
+        # Fall back to pyelftools for anything unexpected
+        if header["e_shentsize"] != struct.calcsize(fmt):
+            for idx, section in enumerate(self.elffile.iter_sections()):
+                sh_type = ENUM_SH_TYPE_BASE.get(section["sh_type"], section["sh_type"])
+                self._section_types.setdefault(sh_type, []).append(idx)
+                self._section_names.setdefault(section.name, idx)
+            return
+
+        start = header["e_shoff"]
+        end = start + count * header["e_shentsize"]
+        headers = list(struct.iter_unpack(fmt, self.handle.map[start:end]))
+        if not headers:
+            return
+
+        # Field 0 is sh_name, 1 is sh_type, 4 is sh_offset, 5 is sh_size
+        shstrtab = headers[self.elffile.get_shstrndx()]
+        strings = self.handle.map[shstrtab[4] : shstrtab[4] + shstrtab[5]]
+        for idx, fields in enumerate(headers):
+            end = strings.find(b"\0", fields[0])
+            name = strings[fields[0] : end if end != -1 else len(strings)]
+            self._section_types.setdefault(fields[1], []).append(idx)
+            self._section_names.setdefault(name.decode("utf-8", errors="replace"), idx)
+
+    def get_sections(self, *types):
+        """Get the sections of one or more types (e.g., SHT_DYNSYM) as
+        (index, section) in section order.
+        """
+        indices = []
+        for sh_type in types:
+            indices += self._section_types.get(sh_type, [])
+        return [(idx, self.elffile.get_section(idx)) for idx in sorted(indices)]
+
+    def get_section_by_name(self, name):
+        idx = self._section_names.get(name)
+        if idx is not None:
+            return self.elffile.get_section(idx)
+
     def get_version_lookup(self):
         """Get versioning used (GNU or Solaris)
         https://github.com/eliben/pyelftools/blob/master/scripts/readelf.py#L915
@@ -91,7 +817,10 @@ class CorpusReader(ELFFile):
             DynamicSection: "type",
         }
 
-        for section in self.elffile.iter_sections():
+        sections = self.get_sections(
+            SHT_GNU_VERSYM, SHT_GNU_VERDEF, SHT_GNU_VERNEED, SHT_DYNAMIC
+        )
+        for _, section in sections:
             if type(section) in types:
                 identifier = types[type(section)]
                 if identifier == "type":
@@ -105,6 +834,96 @@ class CorpusReader(ELFFile):
         if not lookup.get("type") and (lookup.get("verneed") or lookup.get("verdef")):
             lookup["type"] = "Solaris"
         self._versions = lookup
+        self.get_version_table()
+
+    def get_version_table(self):
+        """Decode the version nodes and the .gnu.version array once.
+
+        version_nodes is a dense list from version index to (name, filename),
+        where filename is only set for versions needed from another library
+        (verneed) and entries we don't know are None. symbol_versions holds
+        the raw .gnu.version entry for each dynamic symbol (including the
+        hidden bit), so resolving the version of a symbol is a lookup.
+        """
+        self.version_nodes = []
+        self.symbol_versions = array("H")
+
+        verdef = self._versions.get("verdef")
+        verneed = self._versions.get("verneed")
+        versym = self._versions.get("versym")
+
+        # As with get_version, the first entry for an index wins
+        defined = {}
+        if verdef:
+            for entry, verdaux_iter in verdef.iter_versions():
+                if entry["vd_ndx"] not in defined:
+                    defined[entry["vd_ndx"]] = next(verdaux_iter).name
+        needed = {}
+        if verneed:
+            for entry, vernaux_iter in verneed.iter_versions():
+                for vernaux in vernaux_iter:
+                    if vernaux["vna_other"] not in needed:
+                        needed[vernaux["vna_other"]] = (vernaux.name, entry.name)
+
+        # An index up to the number of verdef entries is a defined version
+        num_defined = verdef.num_versions() if verdef else -1
+        for index in range(max(list(defined) + list(needed) + [-1]) + 1):
+            if index <= num_defined:
+                name = defined.get(index)
+                node = (name, None) if name is not None else None
+            else:
+                node = needed.get(index)
+            self.version_nodes.append(node)
+
+        # .gnu.version is just an array of Elf_Half, decode it in one go
+        if versym:
+            self.symbol_versions.frombytes(versym.data()[: versym.num_symbols() * 2])
+            if (sys.byteorder == "little") != self.elffile.little_endian:
+                self.symbol_versions.byteswap()
+
+    def get_version_node(self, index):
+        """Given a version index (without the hidden bit) return the
+        (name, filename) of the version node, or None if we don't have it.
+        """
+        if 0 <= index < len(self.version_nodes):
+            return self.version_nodes[index]
+
+    def get_symbol_version_index(self, sym_idx):
+        """Get the (version index, hidden) for a dynamic symbol, or None if
+        there isn't version information for it.
+        """
+        if sym_idx >= len(self.symbol_versions):
+            return None
+        index = self.symbol_versions[sym_idx]
+        hidden = False
+
+        # GNU versioning means highest bit is used to store symbol visibility
+        if index not in (0, 1) and self._versions.get("type") == "GNU":
+            if index & 0x8000:
+                index &= ~0x8000
+                hidden = True
+        return index, hidden
+
+    def group_symbols_by_version(self):
+        """Group the dynamic symbol names by version node, returning a lookup
+        of (name, filename) to symbol names. Unversioned symbols (local or
+        global) are grouped under None.
+        """
+        groups = {}
+        for _, section in self.get_sections(SHT_DYNSYM):
+            if section["sh_entsize"] == 0:
+                continue
+            if self._can_read_raw_symbols(section):
+                entries = self._iter_raw_symbols(section)
+            else:
+                entries = self._iter_elftools_symbols(section)
+            for sym_idx, name, _, _, _, _ in entries:
+                version = self.get_symbol_version_index(sym_idx)
+                node = None
+                if version and version[0] not in (0, 1):
+                    node = self.get_version_node(version[0])
+                groups.setdefault(node, []).append(name)
+        return groups
 
     def get_shndx_sections(self):
         """I think this referes to section index/indices. We want a mapping
@@ -112,18 +931,25 @@ class CorpusReader(ELFFile):
         """
         self._shndx_sections = {
             x.symboltable: x
-            for x in self.elffile.iter_sections()
+            for _, x in self.get_sections(SHT_SYMTAB_SHNDX)
             if isinstance(x, SymbolTableIndexSection)
         }
 
-    def get_symbols(self):
-        """Return a set of symbols from the dwarf symbol tables"""
-        symbols = {}
+    def get_symbols(self, fast=True):
+        """Return a SymbolTable of symbols from the elf symbol tables.
 
-        # We want .symtab and .dynsym
+        By default we decode the raw symbol table bytes in bulk, and fall
+        back to the (much slower) pyelftools iter_symbols for anything we
+        can't read that way. fast=False always uses pyelftools, which is
+        handy to check that the two agree.
+        """
+        symbols = SymbolTable()
+
+        # We want .symtab and .dynsym (only .dynsym if we want symbols only)
+        types = [SHT_DYNSYM] if self.symbols_only else [SHT_SYMTAB, SHT_DYNSYM]
         tables = [
             (idx, s)
-            for idx, s in enumerate(self.elffile.iter_sections())
+            for idx, s in self.get_sections(*types)
             if isinstance(s, SymbolTableSection)
         ]
 
@@ -133,30 +959,108 @@ class CorpusReader(ELFFile):
             if section["sh_entsize"] == 0:
                 continue
 
+            if fast and self._can_read_raw_symbols(section):
+                entries = self._iter_raw_symbols(section)
+            else:
+                entries = self._iter_elftools_symbols(section)
+
             # We need the index of the symbol to look up versions
-            for sym_idx, symbol in enumerate(section.iter_symbols()):
+            for sym_idx, name, stype, binding, visibility, shndx in entries:
 
                 # Version info is from the versym / verneed / verdef sections.
-                version_info = self._get_symbol_version(section, sym_idx, symbol)
+                version_info = self._get_symbol_version(section, sym_idx, name)
 
                 # We aren't considering st_value, which could be many things
                 # https://docs.oracle.com/cd/E19683-01/816-1386/6m7qcoblj/index.html#chapter6-35166
-                symbols[symbol.name] = {
-                    "version_info": version_info,
-                    "type": describe_symbol_type(symbol["st_info"]["type"]),
-                    "binding": describe_symbol_bind(symbol["st_info"]["bind"]),
-                    "visibility": describe_symbol_visibility(
-                        symbol["st_other"]["visibility"]
-                    ),
-                    "defined": describe_symbol_shndx(
-                        self._get_symbol_shndx(symbol, sym_idx, idx)
-                    ).strip(),
-                }
+                symbols.add(
+                    name,
+                    stype,
+                    binding,
+                    visibility,
+                    self._get_symbol_shndx(shndx, sym_idx, idx),
+                    version_info,
+                )
 
         return symbols
 
-    def _get_symbol_version(self, section, sym_idx, symbol):
-        """Given a section, symbol index, and symbol, return version info
+    def _iter_elftools_symbols(self, section):
+        """Yield (index, name, type, binding, visibility, shndx) for each
+        symbol in a table, parsing each one with pyelftools.
+        """
+        for sym_idx, symbol in enumerate(section.iter_symbols()):
+            yield (
+                sym_idx,
+                symbol.name,
+                _enum_code(symbol["st_info"]["type"], ENUM_ST_INFO_TYPE),
+                _enum_code(symbol["st_info"]["bind"], ENUM_ST_INFO_BIND),
+                _enum_code(symbol["st_other"]["visibility"], ENUM_ST_VISIBILITY),
+                _enum_code(symbol["st_shndx"], ENUM_ST_SHNDX),
+            )
+
+    def _get_symbol_format(self):
+        """The struct format for one Elf32_Sym / Elf64_Sym. We only need
+        st_name, st_info, st_other, and st_shndx, but note the order of fields
+        is different between the two classes.
+        """
+        order = "<" if self.elffile.little_endian else ">"
+        if self.elffile.elfclass == 32:
+            return order + "IIIBBH"
+        return order + "IBBHQQ"
+
+    def _can_read_raw_symbols(self, section):
+        """We can only decode a table in bulk if it's stored as is in the
+        file (not compressed or empty) and the entry size is what we expect.
+        """
+        return (
+            section["sh_type"] != "SHT_NOBITS"
+            and not section["sh_flags"] & SH_FLAGS.SHF_COMPRESSED
+            and section["sh_entsize"] == struct.calcsize(self._get_symbol_format())
+        )
+
+    def _iter_raw_symbols(self, section):
+        """Yield (index, name, type, binding, visibility, shndx) for each
+        symbol in a table, decoding the whole table with struct.iter_unpack
+        and names from the linked string table, each read once.
+        """
+        data = self.handle.map
+        start = section["sh_offset"]
+        size = section["sh_size"] - section["sh_size"] % section["sh_entsize"]
+        records = struct.iter_unpack(
+            self._get_symbol_format(), data[start : start + size]
+        )
+
+        strtab = self.elffile.get_section(section["sh_link"])
+        strings = data[strtab["sh_offset"] : strtab["sh_offset"] + strtab["sh_size"]]
+
+        # The field order differs, but we only need these four
+        if self.elffile.elfclass == 32:
+            fields = (0, 3, 4, 5)
+        else:
+            fields = (0, 1, 2, 3)
+        st_name, st_info, st_other, st_shndx = fields
+
+        names = {}
+        for sym_idx, record in enumerate(records):
+            offset = record[st_name]
+            name = names.get(offset)
+            if name is None:
+                end = strings.find(b"\0", offset)
+                if end == -1:
+                    end = len(strings)
+                name = strings[offset:end].decode("utf-8", errors="replace")
+                names[offset] = name
+            info = record[st_info]
+            yield (
+                sym_idx,
+                name,
+                info & 0xF,
+                info >> 4,
+                record[st_other] & 0x7,
+                record[st_shndx],
+            )
+
+    def _get_symbol_version(self, section, sym_idx, name):
+        """Given a section, symbol index, and symbol name, return version info
         https://github.com/eliben/pyelftools/blob/master/scripts/readelf.py#L400
         """
         version_info = ""
@@ -168,7 +1072,7 @@ class CorpusReader(ELFFile):
         # readelf doesn't display version info for Solaris versioning
         if section["sh_type"] == "SHT_DYNSYM" and self._versions["type"] == "GNU":
             version = self._symbol_version(sym_idx)
-            if version["name"] != symbol.name and version["index"] not in (
+            if version and version["name"] != name and version["index"] not in (
                 "VER_NDX_LOCAL",
                 "VER_NDX_GLOBAL",
             ):
@@ -187,55 +1091,44 @@ class CorpusReader(ELFFile):
     def _symbol_version(self, idx):
         """We can get version information for a symbol based on it's index
         https://github.com/eliben/pyelftools/blob/master/scripts/readelf.py#L942
+        The version nodes are decoded once in get_version_table.
         """
         symbol_version = dict.fromkeys(("index", "name", "filename", "hidden"))
 
         # No version information available
-        if (
-            not self._versions.get("versym")
-            or idx >= self._versions.get("versym").num_symbols()
-        ):
+        version = self.get_symbol_version_index(idx)
+        if version is None:
             return None
 
-        symbol = self._versions["versym"].get_symbol(idx)
-        index = symbol.entry["ndx"]
-        if not index in ("VER_NDX_LOCAL", "VER_NDX_GLOBAL"):
-            index = int(index)
-
-            # GNU versioning means highest bit is used to store symbol visibility
-            if self._versions["type"] == "GNU":
-                if index & 0x8000:
-                    index &= ~0x8000
-                    symbol_version["hidden"] = True
-
-            if (
-                self._versions.get("verdef")
-                and index <= self._versions["verdef"].num_versions()
-            ):
-                _, verdaux_iter = self._versions["verdef"].get_version(index)
-                symbol_version["name"] = next(verdaux_iter).name
-            else:
-                verneed, vernaux = self._versions["verneed"].get_version(index)
-                symbol_version["name"] = vernaux.name
-                symbol_version["filename"] = verneed.name
+        index, hidden = version
+        if self.symbol_versions[idx] == 0:
+            index = "VER_NDX_LOCAL"
+        elif self.symbol_versions[idx] == 1:
+            index = "VER_NDX_GLOBAL"
+        else:
+            if hidden:
+                symbol_version["hidden"] = True
+            node = self.get_version_node(index)
+            if node:
+                symbol_version["name"], symbol_version["filename"] = node
 
         symbol_version["index"] = index
         return symbol_version
 
-    def _get_symbol_shndx(self, symbol, symbol_index, symtab_index):
+    def _get_symbol_shndx(self, shndx, symbol_index, symtab_index):
         """Every symbol table entry is defined in relation to some section.
         The st_shndx of a symbol holds the relevant section header table index.
         https://github.com/eliben/pyelftools/blob/master/scripts/readelf.py#L994
         """
-        if symbol["st_shndx"] != SHN_INDICES.SHN_XINDEX:
-            return symbol["st_shndx"]
+        if shndx != SHN_INDICES.SHN_XINDEX:
+            return shndx
 
         # Check for or lazily construct index section mapping (symbol table
         # index -> corresponding symbol table index section object)
         if self._shndx_sections is None:
             self._shndx_sections = {
                 sec.symboltable: sec
-                for sec in self.elffile.iter_sections()
+                for _, sec in self.get_sections(SHT_SYMTAB_SHNDX)
                 if isinstance(sec, SymbolTableIndexSection)
             }
         return self._shndx_sections[symtab_index].get_section_index(symbol_index)
@@ -243,7 +1136,7 @@ class CorpusReader(ELFFile):
     def get_dynamic_tags(self):
         """Get the dyamic tags in the ELF file."""
         tags = {}
-        for section in self.elffile.iter_sections():
+        for _, section in self.get_sections(SHT_DYNAMIC):
             if not isinstance(section, DynamicSection):
                 continue
 
@@ -264,9 +1157,10 @@ class CorpusReader(ELFFile):
                     tags["soname"] = tag.soname
 
             return tags
+        return tags
 
     def _iter_dwarf_information_entries(self):
-        dwarfinfo = self.elffile.get_dwarf_info()
+        dwarfinfo = self.handle.dwarfinfo
 
         # A CU is a Compilation Unit
         for cu in dwarfinfo.iter_CUs():
@@ -283,9 +1177,524 @@ class CorpusReader(ELFFile):
         for die in self._iter_dwarf_information_entries():
             yield die
 
-    def parse_dwarf_entries(self):
-        for die in self._iter_dwarf_information_entries():
-            result = parse_children(die)
+    def iter_die_nodes(self):
+        """Yield a lazy DieNode for every DIE, one compilation unit at a time.
+        Once we are done with a CU we drop its decoded DIEs.
+        """
+        dwarfinfo = self.handle.dwarfinfo
+        for cu in dwarfinfo.iter_CUs():
+            top = cu.get_top_DIE()
+            for node in DieNode(dwarfinfo, cu.cu_offset, top.offset).walk():
+                yield node
+            clear_die_cache(cu)
+
+    def get_type_index(self):
+        """Get the (memoized) type index for the DWARF in this file"""
+        if getattr(self, "_type_index", None) is None:
+            self._type_index = TypeIndex(self.handle.dwarfinfo)
+        return self._type_index
+
+    def get_die_slice(self, names):
+        """Get the DIEs relevant to a set of symbol names"""
+        return DieSlice(self.handle.dwarfinfo, names)
+
+    def get_build_id(self):
+        return get_build_id(self.elffile)
+
+    def get_cu_offsets(self):
+        """Enumerate the offsets of every compilation unit (CU) up front.
+        This only reads the CU headers, not the DIEs inside them.
+        """
+        return [cu.cu_offset for cu in self.handle.dwarfinfo.iter_CUs()]
+
+    def parse_cu(self, offset):
+        """Parse the DIE tree for the compilation unit at an offset"""
+        cu = self.handle.dwarfinfo.get_CU_at(offset)
+        result = parse_children(cu.get_top_DIE())
+        clear_die_cache(cu)
+        return result
+
+    def parse_dwarf_entries(self, workers=1):
+        """Parse the DIE tree of each compilation unit, returning a list of
+        results ordered by CU offset. With more than one worker, the CU
+        offsets are sharded across a process pool where each worker opens
+        its own memory map of the file. The result is the same regardless
+        of the number of workers.
+        """
+        offsets = self.get_cu_offsets()
+        if workers <= 1 or len(offsets) <= 1:
+            return [self.parse_cu(offset) for offset in offsets]
+
+        # Contiguous chunks, a few per worker to even out CU sizes
+        size = max(1, len(offsets) // (workers * 4))
+        chunks = [offsets[i : i + size] for i in range(0, len(offsets), size)]
+
+        results = {}
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_dwarf_worker
+        ) as executor:
+            futures = [
+                executor.submit(_parse_dwarf_chunk, self.filename, chunk)
+                for chunk in chunks
+            ]
+            for future in futures:
+                results.update(future.result())
+        return [results[offset] for offset in offsets]
+
+
+def _init_dwarf_worker():
+    """A forked worker shouldn't share the parent's open handles"""
+    elf_handles.close_all()
+
+
+def _parse_dwarf_chunk(filename, offsets):
+    """Parse a chunk of compilation units in a worker process, returning
+    a lookup of CU offset to parsed result.
+    """
+    with CorpusReader(filename) as reader:
+        return {offset: reader.parse_cu(offset) for offset in offsets}
+
+
+def clear_die_cache(cu):
+    """pyelftools keeps every DIE it decodes in a per-CU cache, so walking a
+    big corpus would keep all of them alive. Drop them once we are done with
+    a CU (the top DIE has to stay, the cache expects it first). The cache is
+    private to pyelftools (requirements.txt pins the version we know), so if
+    it isn't there we leave the DIEs until the ElfHandle is closed.
+    """
+    if not hasattr(cu, "_dielist") or not hasattr(cu, "_diemap"):
+        return
+    del cu._dielist[1:]
+    del cu._diemap[1:]
+
+
+class DieNode:
+    """A DieNode is a lazy view of a single DIE (Dwarf Information Entry).
+    It only holds the CU offset and DIE offset, and gets the DIE (its
+    attributes and children) from the CU when they are asked for. pyelftools
+    caches the decoded DIEs of a CU until we clear it with clear_die_cache,
+    so a node that outlives its CU walk decodes the DIE again. Walking nodes
+    uses an explicit stack, so we can go through a huge corpus one DIE at a
+    time instead of building a nested tree.
+    """
+
+    __slots__ = ("dwarfinfo", "cu_offset", "offset")
+
+    def __init__(self, dwarfinfo, cu_offset, offset):
+        self.dwarfinfo = dwarfinfo
+        self.cu_offset = cu_offset
+        self.offset = offset
+
+    def __str__(self):
+        return "[DieNode:%s:%s]" % (self.cu_offset, self.offset)
+
+    def __repr__(self):
+        return str(self)
+
+    @property
+    def cu(self):
+        return self.dwarfinfo.get_CU_at(self.cu_offset)
+
+    @property
+    def die(self):
+        return self.cu.get_DIE_from_refaddr(self.offset)
+
+    @property
+    def tag(self):
+        return self.die.tag
+
+    @property
+    def attributes(self):
+        return self.die.attributes
+
+    @property
+    def has_children(self):
+        return self.die.has_children
+
+    def iter_children(self):
+        for child in self.die.iter_children():
+            yield DieNode(self.dwarfinfo, self.cu_offset, child.offset)
+
+    def parse(self):
+        """Parse this DIE (not including children) into a dict"""
+        return parse_die(self.die)
+
+    def walk(self):
+        """Yield this node and everything under it in depth first order"""
+        yield self
+        stack = [self.iter_children()] if self.has_children else []
+        while stack:
+            child = next(stack[-1], None)
+            if child is None:
+                stack.pop()
+                continue
+            yield child
+            if child.has_children:
+                stack.append(child.iter_children())
+
+
+# Reference forms that are relative to the start of the CU
+_CU_RELATIVE_REF_FORMS = set(
+    [
+        "DW_FORM_ref1",
+        "DW_FORM_ref2",
+        "DW_FORM_ref4",
+        "DW_FORM_ref8",
+        "DW_FORM_ref_udata",
+    ]
+)
+
+
+def get_reference_offset(die, name="DW_AT_type"):
+    """Get the absolute .debug_info offset of the DIE that a reference
+    attribute points to, or None if we can't follow the form (e.g., a type
+    unit signature or a supplementary file).
+    """
+    attr = die.attributes[name]
+    if attr.form in _CU_RELATIVE_REF_FORMS:
+        return die.cu.cu_offset + attr.raw_value
+    if attr.form == "DW_FORM_ref_addr":
+        return attr.raw_value
+
+
+class TypeRecord:
+    """A TypeRecord is what we know about a resolved type: the DIE at the
+    end of a chain of DW_AT_type references (typedef, const, pointer, etc.)
+    """
+
+    __slots__ = ("offset", "tag", "name", "size_in_bits", "complete")
+
+    def __init__(self, die):
+        self.offset = die.offset
+        self.tag = die.tag
+        self.complete = "DW_AT_declaration" not in die.attributes
+
+        self.size_in_bits = None
+        if "DW_AT_byte_size" in die.attributes:
+            self.size_in_bits = die.attributes["DW_AT_byte_size"].value * 8
+
+        # Prefer the linkage name if there is one
+        self.name = None
+        if "DW_AT_linkage_name" in die.attributes:
+            self.name = bytes2str(die.attributes["DW_AT_linkage_name"].value)
+        elif "DW_AT_name" in die.attributes:
+            self.name = bytes2str(die.attributes["DW_AT_name"].value)
+
+    def __str__(self):
+        return "[TypeRecord:%s:%s]" % (self.offset, self.name or self.tag)
+
+    def __repr__(self):
+        return str(self)
+
+
+class TypeIndex:
+    """A TypeIndex maps absolute DIE offsets to the resolved TypeRecord at the
+    end of their DW_AT_type chain. Every offset on a chain is memoized as we
+    walk it, so each chain is walked once per corpus no matter how many
+    variables, members and parameters reference it.
+    """
+
+    def __init__(self, dwarfinfo):
+        self.dwarfinfo = dwarfinfo
+        self.records = {}
+
+    def __str__(self):
+        return "[TypeIndex:%s]" % len(self.records)
+
+    def __repr__(self):
+        return str(self)
+
+    def __len__(self):
+        return len(self.records)
+
+    def get_type(self, die, name="DW_AT_type"):
+        """Get the TypeRecord for the type a DIE references, or None"""
+        if name not in die.attributes:
+            return None
+        offset = get_reference_offset(die, name)
+        if offset is None:
+            return None
+        return self.resolve(offset)
+
+    def resolve(self, offset):
+        """Resolve the type DIE at an absolute offset to its TypeRecord"""
+        if offset in self.records:
+            return self.records[offset]
+
+        # Walk the chain until we hit a type we know, or the end of it
+        chain = []
+        seen = set()
+        while offset is not None and offset not in self.records:
+            if offset in seen:
+                break
+            seen.add(offset)
+            die = self.dwarfinfo.get_DIE_from_refaddr(offset)
+            chain.append(offset)
+            if "DW_AT_type" not in die.attributes:
+                self.records[offset] = TypeRecord(die)
+                break
+            offset = get_reference_offset(die, "DW_AT_type")
+
+        # Everything on the chain resolves to the same final type
+        record = self.records.get(offset)
+        for offset in chain:
+            self.records[offset] = record
+        return record
+
+
+# Children that are part of the interface of a function, or the layout of a type
+_SLICE_CHILDREN = set(
+    [
+        "DW_TAG_formal_parameter",
+        "DW_TAG_unspecified_parameters",
+        "DW_TAG_member",
+        "DW_TAG_inheritance",
+        "DW_TAG_enumerator",
+        "DW_TAG_subrange_type",
+        "DW_TAG_variant_part",
+        "DW_TAG_template_type_param",
+        "DW_TAG_template_value_param",
+        "DW_TAG_GNU_template_parameter_pack",
+    ]
+)
+
+# References we follow from a DIE in a slice
+_SLICE_REFERENCES = [
+    "DW_AT_type",
+    "DW_AT_specification",
+    "DW_AT_abstract_origin",
+    "DW_AT_containing_type",
+]
+
+
+class DieSlice:
+    """A DieSlice is the set of DIEs that matter for a set of symbols: the
+    functions and variables with those linkage names (or names, for C), and
+    the transitive closure of their parameters, DW_AT_type references, and the
+    members of those types. We keep the parents of each DIE too (compile unit,
+    namespace, class), so everything keeps its context. The one pass over the
+    DIEs is kept, so add_names can grow the slice without another one.
+    """
+
+    def __init__(self, dwarfinfo, names):
+        self.dwarfinfo = dwarfinfo
+        self.names = set()
+        self.offsets = set()
+        self.total = 0
+
+        # The DW_AT_name of each root (e.g., "Add" for a C++ function)
+        self.root_names = set()
+
+        # From the pass over the DIEs: parents, the DIEs that refer back to
+        # each DIE, and the functions and variables by name
+        self.parents = {}
+        self.referrers = {}
+        self.named = {}
+        self.build()
+        self.add_names(names)
+
+    def __str__(self):
+        return "[DieSlice:%s/%s]" % (len(self.offsets), self.total)
+
+    def __repr__(self):
+        return str(self)
+
+    def __contains__(self, offset):
+        return offset in self.offsets
+
+    @property
+    def skipped(self):
+        return self.total - len(self.offsets)
+
+    def build(self):
+        """One pass to find the parents, specifications, and the functions
+        and variables (possible roots) by name.
+        """
+        for cu in self.dwarfinfo.iter_CUs():
+            for die in cu.iter_DIEs():
+                if not die.tag:
+                    continue
+                self.total += 1
+                parent = die.get_parent()
+                if parent is not None:
+                    self.parents[die.offset] = parent.offset
+
+                # A definition points to its declaration, so we also need to
+                # go back
+                for name in ["DW_AT_specification", "DW_AT_abstract_origin"]:
+                    if name in die.attributes:
+                        offset = get_reference_offset(die, name)
+                        self.referrers.setdefault(offset, []).append(die.offset)
+
+                if die.tag not in ["DW_TAG_subprogram", "DW_TAG_variable"]:
+                    continue
+                root_name = None
+                if "DW_AT_name" in die.attributes:
+                    root_name = bytes2str(die.attributes["DW_AT_name"].value)
+                for name in [
+                    "DW_AT_linkage_name",
+                    "DW_AT_MIPS_linkage_name",
+                    "DW_AT_name",
+                ]:
+                    if name in die.attributes:
+                        name = bytes2str(die.attributes[name].value)
+                        self.named.setdefault(name, []).append(
+                            (die.offset, root_name)
+                        )
+
+    def add_names(self, names):
+        """Add the roots for more symbol names, and walk from them to take
+        the closure.
+        """
+        stack = []
+        for name in set(names) - self.names:
+            for offset, root_name in self.named.get(name, []):
+                stack.append(offset)
+                if root_name is not None:
+                    self.root_names.add(root_name)
+        self.names |= set(names)
+
+        while stack:
+            offset = stack.pop()
+            if offset is None or offset in self.offsets:
+                continue
+            self.offsets.add(offset)
+            die = self.dwarfinfo.get_DIE_from_refaddr(offset)
+
+            stack.append(self.parents.get(offset))
+            stack += self.referrers.get(offset, [])
+            for name in _SLICE_REFERENCES:
+                if name in die.attributes:
+                    stack.append(get_reference_offset(die, name))
+            for child in die.iter_children():
+                if child.tag in _SLICE_CHILDREN:
+                    stack.append(child.offset)
+
+
+# Default library directories, after those in /etc/ld.so.conf
+default_library_paths = ["/lib", "/usr/lib", "/lib64", "/usr/lib64"]
+
+_ld_so_conf_paths = None
+
+
+def _read_ld_so_conf(filename, seen=None):
+    """Read library directories from an ld.so.conf, following includes"""
+    seen = seen or set()
+    if filename in seen or not os.path.exists(filename):
+        return []
+    seen.add(filename)
+
+    paths = []
+    with open(filename, "r") as fd:
+        for line in fd.readlines():
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            if line.startswith("include"):
+                pattern = line.split(None, 1)[-1]
+                if not os.path.isabs(pattern):
+                    pattern = os.path.join(os.path.dirname(filename), pattern)
+                for included in sorted(glob.glob(pattern)):
+                    paths += _read_ld_so_conf(included, seen)
+            else:
+                paths.append(line)
+    return paths
+
+
+def get_library_paths():
+    """Get the directories the dynamic linker searches after RUNPATH, the
+    same as ldconfig (ld.so.conf and then the default directories).
+    """
+    global _ld_so_conf_paths
+    if _ld_so_conf_paths is None:
+        _ld_so_conf_paths = _read_ld_so_conf("/etc/ld.so.conf")
+    paths = []
+    for path in _ld_so_conf_paths + default_library_paths:
+        if path not in paths and os.path.isdir(path):
+            paths.append(path)
+    return paths
+
+
+def expand_search_path(value, origin):
+    """Split a DT_RUNPATH / DT_RPATH / LD_LIBRARY_PATH value into directories,
+    expanding $ORIGIN to the directory of the object that needs them.
+    """
+    paths = []
+    for path in value.split(":"):
+        if not path:
+            continue
+        path = path.replace("${ORIGIN}", origin).replace("$ORIGIN", origin)
+        paths.append(path)
+    return paths
+
+
+def get_elf_ident(filename):
+    """Get the ELF class, data encoding and machine of a file, or None if it
+    is not ELF. Only libraries that match the requesting object are loaded.
+    For a compressed file we read the decompressed map of its handle if it's
+    open, and otherwise only decompress the first bytes.
+    """
+    ident = None
+    try:
+        handle = elf_handles.get(filename)
+        if handle is not None:
+            ident = handle.map[:20]
+    except (OSError, TypeError, ValueError):
+        ident = None
+
+    if ident is None:
+        try:
+            with open(filename, "rb") as fd:
+                opener = get_decompressor(fd)
+                if opener:
+                    with opener(fd) as stream:
+                        ident = stream.read(20)
+                else:
+                    ident = fd.read(20)
+        except (OSError, EOFError, lzma.LZMAError):
+            return None
+    if len(ident) < 20 or ident[:4] != b"\x7fELF":
+        return None
+    byteorder = "little" if ident[5] == 1 else "big"
+    return ident[4], ident[5], int.from_bytes(ident[18:20], byteorder)
+
+
+def find_needed_library(needed, corpus, loaders=None):
+    """Find the path to a DT_NEEDED entry of a corpus the way the dynamic
+    linker does. DT_RPATH is only used if there is no DT_RUNPATH, and is
+    also inherited from every object in the chain that loaded this one
+    (loaders, from the direct parent up to the executable) that doesn't have
+    a DT_RUNPATH. Then come LD_LIBRARY_PATH, DT_RUNPATH, and the system
+    library directories.
+    """
+    ident = get_elf_ident(corpus.path)
+
+    # A needed entry with a slash is a path, relative to the working directory
+    if "/" in needed:
+        if os.path.exists(needed) and get_elf_ident(needed) == ident:
+            return os.path.abspath(needed)
+        return None
+
+    origin = os.path.dirname(os.path.realpath(corpus.path))
+    paths = []
+    if not corpus.runpath:
+        for rpath in corpus.rpath or []:
+            paths += expand_search_path(rpath, origin)
+        for loader in loaders or []:
+            if loader.runpath:
+                continue
+            origin_loader = os.path.dirname(os.path.realpath(loader.path))
+            for rpath in loader.rpath or []:
+                paths += expand_search_path(rpath, origin_loader)
+    paths += expand_search_path(os.environ.get("LD_LIBRARY_PATH", ""), origin)
+    for runpath in corpus.runpath or []:
+        paths += expand_search_path(runpath, origin)
+    paths += get_library_paths()
+
+    for path in paths:
+        candidate = os.path.join(path, needed)
+        if os.path.exists(candidate) and get_elf_ident(candidate) == ident:
+            return os.path.abspath(candidate)
 
 
 class Corpus:
@@ -293,16 +1702,33 @@ class Corpus:
     variables, and nested Dwarf Information Entries
     """
 
-    def __init__(self, filename, include_dwarf_entries=False, load_needed_libs=True):
+    def __init__(
+        self,
+        filename,
+        include_dwarf_entries=False,
+        load_needed_libs=False,
+        workers=1,
+        cache=None,
+        symbols_only=False,
+    ):
         self.elfheader = {}
 
         # This could be split into variables / symbols
-        self.elfsymbols = {}
+        self.elfsymbols = SymbolTable()
         self.path = filename
         self.dynamic_tags = {}
         self.architecture = None
         self._soname = None
-        self.read_elf_corpus(include_dwarf_entries)
+        self.reader = None
+        self.abi_instr = []
+        self.cache = cache
+        self.dependencies = None
+
+        # A symbols only corpus never reads (or needs) DWARF
+        self.symbols_only = symbols_only
+        if symbols_only:
+            include_dwarf_entries = False
+        self.read_elf_corpus(include_dwarf_entries, workers)
 
         # If we want a full set of symbols, we need elf needed loaded
         if load_needed_libs:
@@ -314,9 +1740,33 @@ class Corpus:
     def __repr__(self):
         return str(self)
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
     def exists(self):
         return self.path is not None and os.path.exists(self.path)
 
+    def get_reader(self):
+        """Get the one reader for the corpus, opening it again if closed"""
+        # A forked worker closes the handles it inherits, so check that too
+        reader = self.reader
+        if reader is None or reader.handle is None or reader.handle.closed:
+            self.reader = CorpusReader(self.path, symbols_only=self.symbols_only)
+        return self.reader
+
+    def close(self):
+        """Close the reader, releasing the shared ELF handle (and the corpora
+        of the needed libraries, if we loaded them)
+        """
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+        if self.dependencies is not None:
+            self.dependencies.close()
+
     @property
     def soname(self):
         return self.dynamic_tags.get("soname")
@@ -335,22 +1785,44 @@ class Corpus:
 
     def iter_dwarf_information_entries(self):
         """Return flattened list of DIEs (Dwarf Information Entrys"""
-        reader = CorpusReader(self.path)
+        reader = self.get_reader()
         for entry in reader.iter_dwarf_information_entries():
             yield entry
 
-    def load_elf_needed(self):
+    def iter_die_nodes(self):
+        """Return lazy DieNodes for each DIE, walking one at a time"""
+        reader = self.get_reader()
+        for node in reader.iter_die_nodes():
+            yield node
+
+    def get_type_index(self):
+        """Get the type index shared by everything that resolves DW_AT_type"""
+        return self.get_reader().get_type_index()
+
+    def get_die_slice(self, names):
+        """Get the DieSlice of DIEs relevant to a set of symbol names"""
+        return self.get_reader().get_die_slice(names)
+
+    def load_elf_needed(self, workers=None):
         """In order to find other undefined symbols, we might also need to
-        load these other libraries that are used.
+        load these other libraries that are used. This loads the transitive
+        closure of DT_NEEDED into a DependencyGraph (self.dependencies).
         """
-        # TODO: if we don't want to provide a third binary, we could do this
-        pass
+        self.dependencies = DependencyGraph(self, cache=self.cache)
+        self.dependencies.load(workers)
+        return self.dependencies
 
-    def read_elf_corpus(self, include_dwarf_entries=False):
+    def read_elf_corpus(self, include_dwarf_entries=False, workers=1):
         """Read the entire elf corpus, including dynamic and other sections
         expected for showing ABI information
         """
-        reader = CorpusReader(self.path)
+        # If we have a cached corpus, we don't need to read anything
+        if self.cache is not None and self.cache.load(
+            self, include_dwarf_entries, self.symbols_only
+        ):
+            return
+
+        reader = self.get_reader()
 
         # Read in the header section as part of the corpus
         self.elfheader = reader.header
@@ -361,9 +1833,243 @@ class Corpus:
         self.elfclass = reader.get_elf_class()
         self.elfsymbols = reader.get_symbols()
 
-        # Labeled as abi-instr in libabigail
+        # Labeled as abi-instr in libabigail, one per compilation unit
         if include_dwarf_entries:
-            abi_instr = reader.parse_dwarf_entries()
+            self.abi_instr = reader.parse_dwarf_entries(workers)
+
+        if self.cache is not None:
+            self.cache.save(self, include_dwarf_entries, self.symbols_only)
+
+
+class CorpusStore:
+    """The CorpusStore holds the corpora read in this process, keyed by the
+    ELF handle registry key and how the corpus was read, so a file is only
+    read once no matter how many parsers (or dependency graphs) need it. A
+    value is a future, so a corpus being loaded is never loaded twice. Users
+    acquire a corpus and release it, and the last release closes it and
+    drops it from the store.
+    """
+
+    def __init__(self):
+        self._futures = {}
+        self._refcounts = {}
+        self._lock = threading.Lock()
+
+    def __str__(self):
+        return "[CorpusStore:%s]" % len(self._futures)
+
+    def __repr__(self):
+        return str(self)
+
+    def __len__(self):
+        return len(self._futures)
+
+    def acquire(self, key, load, executor=None):
+        """Get a future for the corpus of a key, and add a reference to it.
+        If we don't have it, load() reads it (on the executor if given).
+        """
+        with self._lock:
+            future = self._futures.get(key)
+            new = future is None
+            if new:
+                future = Future()
+                self._futures[key] = future
+            self._refcounts[key] = self._refcounts.get(key, 0) + 1
+
+        if new and executor is not None:
+            executor.submit(self._load, key, future, load)
+        elif new:
+            self._load(key, future, load)
+        return future
+
+    def _load(self, key, future, load):
+        try:
+            future.set_result(load())
+        except (Exception, SystemExit) as e:
+            # Don't keep a failed load for anyone else
+            with self._lock:
+                if self._futures.get(key) is future:
+                    del self._futures[key]
+                    self._refcounts.pop(key, None)
+            future.set_exception(e)
+
+    def release(self, key):
+        """Drop a reference to a corpus, closing it if it's the last one"""
+        with self._lock:
+            if key not in self._refcounts:
+                return
+            self._refcounts[key] -= 1
+            if self._refcounts[key] > 0:
+                return
+            del self._refcounts[key]
+            future = self._futures.pop(key)
+        if future.done() and future.exception() is None:
+            future.result().close()
+
+
+corpus_store = CorpusStore()
+
+
+def get_corpus_key(filename, include_dwarf_entries, load_needed_libs, symbols_only):
+    """The CorpusStore key for a file, and how we read it"""
+    return (
+        elf_handles.get_key(filename),
+        include_dwarf_entries and not symbols_only,
+        load_needed_libs,
+        symbols_only,
+    )
+
+
+class DependencyGraph:
+    """A DependencyGraph is the closure of the DT_NEEDED libraries of a corpus.
+    Each library is read (symbols only) through the corpus_store, so it's
+    shared with every graph and parser and libc is parsed once no matter how
+    many binaries need it.
+    Libraries are loaded concurrently, and once loaded we index who provides
+    each symbol (in the breadth first order the dynamic linker uses) so that
+    resolving a symbol is a dict lookup.
+    """
+
+    def __init__(self, corpus, cache=None):
+        self.corpus = corpus
+        self.cache = cache
+
+        # Lookup of path to corpus, and path to needed paths (in order)
+        self.nodes = {corpus.path: corpus}
+        self.edges = {}
+
+        # Needed entries we could not find, by the path that needs them
+        self.missing = {}
+
+        # Lookup of symbol name to paths that provide it, in search order
+        self.providers = {}
+
+        # Keys of the corpora we acquired from the corpus_store
+        self.keys = []
+
+    def __str__(self):
+        return "[DependencyGraph:%s]" % self.corpus.path
+
+    def __repr__(self):
+        return str(self)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def _load_corpus(self, path):
+        corpus = Corpus(
+            path, load_needed_libs=False, cache=self.cache, symbols_only=True
+        )
+        # We have what we need, don't hold the file open
+        corpus.close()
+        return corpus
+
+    def _get_future(self, key, path, executor):
+        """Get the (shared) future that loads a dependency corpus"""
+        return corpus_store.acquire(key, lambda: self._load_corpus(path), executor)
+
+    def _add_needed(self, path, loaders=None):
+        """Resolve the needed entries of a loaded corpus, returning the new
+        (path, needed entry) that we need to load
+        """
+        corpus = self.nodes[path]
+        self.edges[path] = []
+        found = []
+        queued = set()
+        for needed in corpus.needed:
+            needed_path = find_needed_library(needed, corpus, loaders)
+            if needed_path is None:
+                self.missing.setdefault(path, []).append(needed)
+                continue
+            self.edges[path].append(needed_path)
+            if needed_path not in self.nodes and needed_path not in queued:
+                queued.add(needed_path)
+                found.append((needed_path, needed))
+        return found
+
+    def load(self, workers=None):
+        """Load the closure of needed libraries, concurrently"""
+        # The chain of corpora that loaded each path (the direct parent first)
+        loaders = {self.corpus.path: []}
+        pending = {}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+
+            def submit(found, parent):
+                for path, needed in found:
+                    if path in loaders:
+                        continue
+                    loaders[path] = [parent] + loaders[parent.path]
+                    key = get_corpus_key(path, False, False, True)
+                    future = self._get_future(key, path, executor)
+                    pending[future] = (key, path, parent.path, needed)
+
+            submit(self._add_needed(self.corpus.path), self.corpus)
+            while pending:
+                done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                for future in done:
+                    key, path, parent, needed = pending.pop(future)
+                    try:
+                        self.nodes[path] = future.result()
+                    except (Exception, SystemExit):
+                        # The store doesn't keep a failed load for other graphs
+                        # (so there is nothing to release either)
+                        self.missing.setdefault(parent, []).append(needed)
+                        continue
+                    self.keys.append(key)
+                    submit(self._add_needed(path, loaders[path]), self.nodes[path])
+
+        self.index_providers()
+        return self
+
+    def close(self):
+        """Release the dependency corpora we acquired from the corpus_store.
+        The nodes keep their symbols, but another load needs them again.
+        """
+        for key in self.keys:
+            corpus_store.release(key)
+        self.keys = []
+
+    def iter_search_order(self):
+        """Yield paths in the order the dynamic linker searches them for
+        symbols (breadth first from the corpus, following needed order).
+        """
+        seen = set([self.corpus.path])
+        queue = [self.corpus.path]
+        while queue:
+            path = queue.pop(0)
+            yield path
+            for needed_path in self.edges.get(path, []):
+                if needed_path not in seen and needed_path in self.nodes:
+                    seen.add(needed_path)
+                    queue.append(needed_path)
+
+    def index_providers(self):
+        """Build the lookup of symbol name to the paths that define it"""
+        self.providers = {}
+        for path in self.iter_search_order():
+            for name in self.nodes[path].elfsymbols.exported_names():
+                self.providers.setdefault(name, []).append(path)
+
+    def resolve(self, name):
+        """Get the corpus that a symbol binds to, or None. Names from .symtab
+        can carry a version (printf@GLIBC_2.2.5), which we don't index on.
+        """
+        paths = self.providers.get(name.split("@", 1)[0])
+        if paths:
+            return self.nodes[paths[0]]
+
+    def unresolved_symbols(self):
+        """Undefined symbols of the corpus that nothing in the graph provides.
+        Weak undefined symbols (e.g., __gmon_start__) are allowed to be missing.
+        """
+        symbols = self.corpus.elfsymbols
+        return set(
+            name
+            for name, row in symbols.index.items()
+            if not symbols.is_defined(row)
+            and symbols.bindings[row] not in (_STB_LOCAL, _STB_WEAK)
+            and self.resolve(name) is None
+        )
 
 
 class ABIParser:
@@ -372,8 +2078,17 @@ class ABIParser:
     subcorpora.
     """
 
-    def __init__(self):
-        pass
+    def __init__(self, cache_dir=None, max_cache_size=512 * 1024 * 1024):
+        """
+        Arguments:
+            cache_dir (path): an optional directory to cache parsed corpora
+            max_cache_size (int): the most bytes to keep in the cache
+        """
+        # Corpora this parser has acquired from the (shared) corpus_store
+        self.corpora = {}
+        self.cache = None
+        if cache_dir:
+            self.cache = CorpusCache(cache_dir, max_cache_size)
 
     def __str__(self):
         return "[ABIParser]"
@@ -382,7 +2097,12 @@ class ABIParser:
         return str(self)
 
     def get_corpus_from_elf(
-        self, filename, include_dwarf_entries=False, load_needed_libs=True
+        self,
+        filename,
+        include_dwarf_entries=False,
+        load_needed_libs=False,
+        workers=1,
+        symbols_only=False,
     ):
         """
         Given an elf binary, read it in with elfutils ELFFile and then
@@ -391,43 +2111,93 @@ class ABIParser:
         Arguments:
             filename (path): path to filename to get corpus for
             include_dwarf_entries (bool): parse dwarf entries (DIEs)
-            load_needed_libs(bool): try to find and load needed libraries
+            load_needed_libs(bool): find and load the closure of needed
+              libraries (e.g., libc) into corpus.dependencies (default: False)
+            workers (int): number of processes to parse dwarf entries with
+            symbols_only (bool): only read dynamic symbols and tags, skipping
+              DWARF entirely (works for stripped binaries)
         """
         filename = os.path.abspath(filename)
         if not os.path.exists(filename):
             sys.exit("%s does not exist." % filename)
 
-        # Create a new corpus to interact with
-        return Corpus(filename, include_dwarf_entries, load_needed_libs)
+        # A file that hasn't changed on disk is only parsed once per process
+        # (the number of workers doesn't change the result)
+        key = get_corpus_key(
+            filename, include_dwarf_entries, load_needed_libs, symbols_only
+        )
+        if key not in self.corpora:
+
+            def load():
+                return Corpus(
+                    filename,
+                    include_dwarf_entries,
+                    load_needed_libs,
+                    workers,
+                    self.cache,
+                    symbols_only,
+                )
+
+            # A failed load isn't kept in the store, so there is nothing to release
+            self.corpora[key] = corpus_store.acquire(key, load).result()
+        return self.corpora[key]
+
+    def close(self):
+        """Release the corpora this parser has read (the last user of a corpus
+        closes it, so we never close one that another parser is using)
+        """
+        for key in self.corpora:
+            corpus_store.release(key)
+        self.corpora.clear()
 
 
 def get_die_filepath(die):
-    filepath = None
+    """If a DIE has DW_AT_decl_file, look up the path in the CU file table"""
     if "DW_AT_decl_file" in die.attributes:
-        index = die.attributes["DW_AT_decl_file"].value
+        return get_cu_filename(die.cu, die.attributes["DW_AT_decl_file"].value)
 
-        # TODO: need to debug why this fails sometimes
-        try:
-            filepath = get_cu_filename(die.cu, index)
-        except:
-            pass
-    return filepath
+
+def get_cu_file_table(cu):
+    """Resolve the file table of a CU's line program (index to path) once,
+    and cache it on the CU. Parsing the line program header for every DIE
+    with a DW_AT_decl_file was one of our slowest paths.
+    """
+    table = getattr(cu, "_file_table", None)
+    if table is not None:
+        return table
+
+    table = []
+    lineprogram = cu.dwarfinfo.line_program_for_CU(cu)
+    if lineprogram is not None:
+        directories = [bytes2str(x) for x in lineprogram["include_directory"]]
+
+        # Before DWARF 5, file and directory indices start at 1 (0 is the CU)
+        offset = 0 if lineprogram["version"] >= 5 else 1
+        if offset:
+            table.append(None)
+
+        for entry in lineprogram["file_entry"]:
+            filename = bytes2str(entry.name)
+            if directories:
+                dir_index = entry.dir_index - offset
+                if dir_index >= 0 and dir_index < len(directories):
+                    dir_name = directories[dir_index]
+                else:
+                    dir_name = "."
+                filename = "%s/%s" % (dir_name, filename)
+            table.append(filename)
+
+    cu._file_table = table
+    return table
 
 
 def get_cu_filename(cu, idx=0):
-    """A DW_AT_decl_file I think can be looked up, by index, from the CU
-    file entry and directory index.
+    """A DW_AT_decl_file can be looked up, by index, from the CU file table.
+    We return None for an index that isn't in the table.
     """
-    lineprogram = cu.dwarfinfo.line_program_for_CU(cu)
-    cu_filename = bytes2str(lineprogram["file_entry"][idx - 1].name)
-    if len(lineprogram["include_directory"]) > 0:
-        dir_index = lineprogram["file_entry"][idx - 1].dir_index
-        if dir_index > 0:
-            dir_name = bytes2str(lineprogram["include_directory"][dir_index - 1])
-        else:
-            dir_name = "."
-        cu_filename = "%s/%s" % (dir_name, cu_filename)
-    return cu_filename
+    table = get_cu_file_table(cu)
+    if idx >= 0 and idx < len(table):
+        return table[idx]
 
 
 def parse_compile_unit(die):
@@ -933,10 +2703,9 @@ def parse_gnu_call_site_parameter(die):
     return dmeta
 
 
-def parse_children(die, parent=None, child_list=None):
-    """parse children will loop recursively through dwarf information entries
-    and based on the type, add it to the list of children. We then parse
-    any remaining children.
+def parse_die(die):
+    """parse a single dwarf information entry based on its tag, not including
+    its children.
     """
     dmeta = {}
 
@@ -1050,17 +2819,37 @@ def parse_children(die, parent=None, child_list=None):
 
     else:
         print("%s not parsed." % die.tag)
+    return dmeta
 
-    # We keep a handle on the root to return
-    if not parent:
-        parent = dmeta
-    elif dmeta:
-        child_list.append(dmeta)
 
+def parse_children(die):
+    """parse children will loop through dwarf information entries under a die
+    and based on the type, add it to the list of children. We walk the tree
+    with an explicit stack of child iterators (in the same order as a
+    recursive walk) so deep trees don't hit the recursion limit.
+    """
+    root = parse_die(die)
+    stack = []
     if die.has_children:
-        for child in die.iter_children():
-            parse_children(child, parent, dmeta["children"])
-    return parent
+        stack.append((die.iter_children(), root.get("children")))
+
+    while stack:
+        children, child_list = stack[-1]
+        child = next(children, None)
+        if child is None:
+            stack.pop()
+            continue
+
+        dmeta = parse_die(child)
+        if dmeta and child_list is not None:
+            child_list.append(dmeta)
+
+        # A DIE we don't keep (or without a children list) still has its
+        # children walked, and they go to the closest list above it
+        if child.has_children:
+            children = dmeta.get("children", child_list) if dmeta else child_list
+            stack.append((child.iter_children(), children))
+    return root
 
 
 def attribute_has_location_list(attr):
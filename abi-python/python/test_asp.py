@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# Check the facts we generate with the compact schema and a fact cache: facts
+# replayed from the cache must not bring the integer ids of an earlier run.
+#
+# python -m pytest test_asp.py
+
+import collections
+import io
+import os
+import re
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("clingo")
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import asp
+
+here = os.path.dirname(os.path.abspath(__file__))
+examples = os.path.join(here, "..", "..", "test-cases", "examples")
+
+side_table = re.compile(
+    r"^(symbol_name|corpus_path|die_offset)\((\d+),(.*)\)\.$", re.MULTILINE
+)
+
+
+def build(compiler, outdir, output, source, *args):
+    """Build an example (a library or client) like the Makefiles do"""
+    if not shutil.which(compiler):
+        pytest.skip("%s is not installed." % compiler)
+    output = os.path.join(outdir, output)
+    cmd = [compiler, "-g", "-o", output, os.path.join(examples, source)]
+    result = subprocess.run(cmd + list(args), capture_output=True)
+    if result.returncode != 0:
+        pytest.skip("Cannot build %s with %s." % (source, compiler))
+    return output
+
+
+def build_example(outdir, example, compiler, extension):
+    """Build the two libraries and client of an example in test-cases"""
+    source = os.path.join(example, "MathLibrary%s")
+    os.makedirs(outdir)
+    flags = ["-fPIC", "-shared"]
+    libA = build(compiler, outdir, "libmath-v1.so", source % extension, *flags)
+    libB = build(
+        compiler, outdir, "libmath-v2.so", source % ("Changed" + extension), *flags
+    )
+    includes = "-I" + os.path.join(examples, example)
+    client = os.path.join(example, "MathClient" + extension)
+    binary = build(compiler, outdir, "math-client", client, includes, libA)
+    return binary, libA, libB
+
+
+def test_compact_fact_cache_ids(tmp_path):
+    outdir = str(tmp_path)
+    cpp = build_example(
+        os.path.join(outdir, "cpp"), "parameter_type_change/cpp", "g++", ".cpp"
+    )
+    c = build_example(
+        os.path.join(outdir, "c"), "parameter_type_change/c", "gcc", ".c"
+    )
+
+    # The same libraries with two different binaries, so the ids of the
+    # library names are different in each run
+    binaries = [cpp[0], c[0]]
+    libA, libB = cpp[1:]
+
+    cache_dir = os.path.join(outdir, "cache")
+    for binary in binaries:
+        out = io.StringIO()
+        asp.generate_facts(
+            [binary, libA, libB], out=out, compact=True, cache_dir=cache_dir
+        )
+
+        # Each id has one value, and each value one id
+        values = collections.defaultdict(set)
+        ids = collections.defaultdict(set)
+        for name, identifier, value in side_table.findall(out.getvalue()):
+            values[(name, identifier)].add(value)
+            ids[(name, value)].add(identifier)
+        assert values
+        assert all(len(x) == 1 for x in values.values())
+        assert all(len(x) == 1 for x in ids.values())
+
+
+def test_interner_matches_symbol():
+    """Interned facts are the same as AspFunction.symbol, including for bool
+    and unhashable arguments (which we don't keep)
+    """
+    interner = asp.SymbolInterner()
+    for args in [("a", 1), ("a", True), ("a", 1), ("a", [1, 2]), ("a", {"k": 1})]:
+        expected = asp.AspFunction("x", args).symbol()
+        assert interner.function("x", args) == expected
+        assert interner.function("x", list(args)) == expected
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# Check that decoding raw symbol tables in bulk (struct.iter_unpack) gives the
+# same SymbolTable as pyelftools, for 32 and 64 bit libraries built from the
+# examples in test-cases.
+#
+# python -m pytest test_corpus.py
+
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import CorpusReader
+
+here = os.path.dirname(os.path.abspath(__file__))
+examples = os.path.join(here, "..", "..", "test-cases", "examples")
+
+# Each library source, and the compiler for it
+sources = [
+    ("array_size_change/cpp/MathLibrary.cpp", "g++"),
+    ("array_size_change/cpp/MathLibraryChanged.cpp", "g++"),
+    ("parameter_type_change/c/MathLibrary.c", "gcc"),
+    ("parameter_type_change/c/MathLibraryChanged.c", "gcc"),
+    ("parameter_type_change/cpp/MathLibrary.cpp", "g++"),
+    ("parameter_type_change/cpp/MathLibraryChanged.cpp", "g++"),
+]
+
+
+def build_library(source, compiler, bits, outdir):
+    """Build a shared library like the example Makefiles do. Without a libc
+    for the arch (common for -m32) we build it without the standard
+    libraries, which is fine for reading symbols.
+    """
+    if not shutil.which(compiler):
+        pytest.skip("%s is not installed." % compiler)
+    source = os.path.join(examples, source)
+    name = "%s-%s.so" % (os.path.splitext(os.path.basename(source))[0], bits)
+    lib = os.path.join(outdir, name)
+    cmd = [compiler, "-g", "-fPIC", "-shared", "-m%s" % bits, "-o", lib, source]
+    for extra in [[], ["-nostdlib"]]:
+        result = subprocess.run(cmd + extra, capture_output=True)
+        if result.returncode == 0:
+            return lib
+    pytest.skip("Cannot build a %s bit library with %s." % (bits, compiler))
+
+
+def get_symbols(lib, fast, symbols_only=False):
+    with CorpusReader(lib, symbols_only=symbols_only) as reader:
+        return dict(reader.get_symbols(fast=fast).items())
+
+
+@pytest.mark.parametrize("bits", [32, 64])
+@pytest.mark.parametrize("source,compiler", sources)
+def test_fast_symbols_match_pyelftools(source, compiler, bits, tmp_path):
+    lib = build_library(source, compiler, bits, str(tmp_path))
+    for symbols_only in [False, True]:
+        fast = get_symbols(lib, True, symbols_only)
+        slow = get_symbols(lib, False, symbols_only)
+        assert fast
+        assert fast == slow
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# Benchmark reading compressed (gzip, xz, bz2) abidw xml directly, compared to
+# the old workflow of decompressing each one to a temporary file first. We time
+# loading the whole xml (xmltodict) and generating facts from the stream.
+#
+# python benchmark_compressed.py <compressed-xml> [<compressed-xml> ...]
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import clingo
+
+from libabigail_asp import (
+    ABICompatSolverSetup,
+    PyclingoDriver,
+    compression_magic,
+    load_xml,
+)
+
+
+def stream_facts(xml_file):
+    """Generate facts from the xml as a stream (the text goes nowhere)"""
+    driver = PyclingoDriver(cores=False, asp=open(os.devnull, "w"))
+    control = clingo.Control()
+    with control.backend() as backend:
+        driver.backend = backend
+        driver.assumptions = []
+        ABICompatSolverSetup(stream=True).setup(driver, [xml_file])
+    driver.out.close()
+
+
+def with_tempfile(func):
+    """Decompress to a temporary file before calling func on it"""
+
+    def run(xml_file):
+        with open(xml_file, "rb") as fd:
+            magic = fd.read(6)
+            fd.seek(0)
+            opener = [x[1] for x in compression_magic if magic.startswith(x[0])]
+            if not opener:
+                sys.exit("%s is not compressed." % xml_file)
+            with opener[0](fd) as stream, tempfile.NamedTemporaryFile(
+                suffix=".xml"
+            ) as tmp:
+                shutil.copyfileobj(stream, tmp)
+                tmp.flush()
+                func(tmp.name)
+
+    return run
+
+
+def timed(func, xml_file):
+    start = time.time()
+    func(xml_file)
+    return time.time() - start
+
+
+def main():
+    xml_files = sys.argv[1:]
+    if not xml_files:
+        sys.exit("Usage: benchmark_compressed.py <compressed-xml> ...")
+
+    runs = [
+        ("load, before: temporary file", with_tempfile(load_xml)),
+        ("load, direct", load_xml),
+        ("stream facts, before: temporary file", with_tempfile(stream_facts)),
+        ("stream facts, direct", stream_facts),
+    ]
+    for xml_file in xml_files:
+        print("%s (%d bytes)" % (xml_file, os.path.getsize(xml_file)))
+        for name, func in runs:
+            seconds = min(timed(func, xml_file) for _ in range(3))
+            print("  %-40s %8.4fs" % (name, seconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,14 +2,21 @@
 # It will eventually be added back to that scope - this script is developing
 # new functionality to work with ABI.
 
+import bz2
 import collections
 import copy
+import gzip
+import io
 import itertools
+import json
+import lzma
 import os
 import pprint
 import sys
 import time
 import types
+import xml.etree.ElementTree as ElementTree
+import xml.parsers.expat as expat
 import xmltodict
 from six import string_types
 
@@ -119,6 +126,9 @@ class AspFunctionBuilder(object):
 
 fn = AspFunctionBuilder()
 
+# The children of a namespace-decl that we generate facts for
+namespace_children = ["namespace-decl", "class-decl", "function-decl"]
+
 
 def all_compilers_in_config():
     return spack.compilers.all_compilers()
@@ -360,9 +370,12 @@ class PyclingoDriver(object):
 class ABICompatSolverSetup(object):
     """Class to set up and run an ABI Compatability Solver."""
 
-    def __init__(self):
+    def __init__(self, stream=False):
         self.gen = None  # set by setup()
 
+        # Parse each corpus xml as a stream instead of loading it into memory
+        self.stream = stream
+
         # A lookup of DIEs based on corpus path (first key) and id
         # (second key) DIE == Dwarf Information Entry
         self.die_lookup = {}
@@ -673,9 +686,7 @@ class ABICompatSolverSetup(object):
         current full path to where we are in the structure
         """
         for entry in data:
-            name = self._get_namespaced_name(entry["@name"], namespace)
-            self.gen.fact(fn.namespace(name))
-            self.gen.fact(fn.has_namespace(corpus, name))
+            name = self._add_namespace(corpus, entry, namespace)
             if "namespace-decl" in entry:
                 self._generate_namespace_decl(corpus, entry["namespace-decl"], name)
             if "class-decl" in entry:
@@ -687,9 +698,16 @@ class ABICompatSolverSetup(object):
             for attr in entry:
                 if attr.startswith("@"):
                     continue
-                if attr not in ["namespace-decl", "class-decl", "function-decl"]:
+                if attr not in namespace_children:
                     print("% Found namespace child not being parsed: " + attr)
 
+    def _add_namespace(self, corpus, entry, namespace=None):
+        """Add facts for a namespace, and return its full (namespaced) name"""
+        name = self._get_namespaced_name(entry["@name"], namespace)
+        self.gen.fact(fn.namespace(name))
+        self.gen.fact(fn.has_namespace(corpus, name))
+        return name
+
     @ensure_list
     def _generate_function_decl(self, corpus, data, namespace=None):
         """Generate facts for function declarations. We might need to add
@@ -788,15 +806,7 @@ class ABICompatSolverSetup(object):
             if not instr:
                 continue
 
-            # This currently assumes abigail consistently provides these attributes
-            self.gen.fact(fn.corpus_abigail_version(corpus["@path"], instr["@version"]))
-            self.gen.fact(
-                fn.corpus_address_size(corpus["@path"], instr["@address-size"])
-            )
-            self.gen.fact(
-                fn.corpus_compile_directory(corpus["@path"], instr["@comp-dir-path"])
-            )
-            self.gen.fact(fn.corpus_language(corpus["@path"], instr["@language"]))
+            self._generate_abi_instr(corpus["@path"], instr)
 
             # For each remaining type, generate facts
             for attr in list(instr.keys()):
@@ -805,15 +815,27 @@ class ABICompatSolverSetup(object):
                 if attr.startswith("@"):
                     continue
 
-                # Dynamically derive function names
-                func_name = "_generate_%s" % attr.replace("-", "_")
-
-                # Warn if we are missing parsing something!
-                if not hasattr(self, func_name):
-                    print("% Warning, missing parsing of %s" % attr)
-
                 # The corpus path is it's unique identifier
-                getattr(self, func_name)(corpus["@path"], instr[attr])
+                self._generate_abi_instr_child(corpus["@path"], attr, instr[attr])
+
+    def _generate_abi_instr(self, corpus, instr):
+        """Generate facts for the attributes of an abi-instr"""
+        # This currently assumes abigail consistently provides these attributes
+        self.gen.fact(fn.corpus_abigail_version(corpus, instr["@version"]))
+        self.gen.fact(fn.corpus_address_size(corpus, instr["@address-size"]))
+        self.gen.fact(fn.corpus_compile_directory(corpus, instr["@comp-dir-path"]))
+        self.gen.fact(fn.corpus_language(corpus, instr["@language"]))
+
+    def _generate_abi_instr_child(self, corpus, attr, data):
+        """Generate facts for one child (or list of children) of an abi-instr"""
+        # Dynamically derive function names
+        func_name = "_generate_%s" % attr.replace("-", "_")
+
+        # Warn if we are missing parsing something!
+        if not hasattr(self, func_name):
+            print("% Warning, missing parsing of %s" % attr)
+            return
+        getattr(self, func_name)(corpus, data)
 
     # TODO: what would a condition be here for ABI?
     #            condition_id = self.condition(cond, dep.spec, pkg.name)
@@ -831,31 +853,7 @@ class ABICompatSolverSetup(object):
                 symbols = [symbols]
 
             for symbol in symbols:
-
-                self.gen.fact(fn.symbol(symbol["@name"]))
-
-                # A symbol might be defined across two corpora with
-                # different attributes, so we include the corpora here
-                self.gen.fact(
-                    fn.symbol_type(corpus["@path"], symbol["@name"], symbol["@type"])
-                )
-                self.gen.fact(
-                    fn.symbol_binding(
-                        corpus["@path"], symbol["@name"], symbol["@binding"]
-                    )
-                )
-                self.gen.fact(
-                    fn.symbol_visibility(
-                        corpus["@path"], symbol["@name"], symbol["@visibility"]
-                    )
-                )
-                self.gen.fact(
-                    fn.symbol_is_defined(
-                        corpus["@path"], symbol["@name"], symbol["@is-defined"]
-                    )
-                )
-                # This might be redundant since the corpora is included in the above
-                self.gen.fact(fn.has_symbol(corpus["@path"], symbol["@name"]))
+                self._generate_function_symbol(corpus["@path"], symbol)
 
             # Elf variable symbols (has added size)
             symbols = corpus.get("elf-variable-symbols", {}).get("elf-symbol", [])
@@ -863,18 +861,34 @@ class ABICompatSolverSetup(object):
                 symbols = [symbols]
 
             for symbol in symbols:
-
-                self.gen.fact(fn.symbol(symbol["@name"]))
-                self.gen.fact(fn.symbol_size(symbol["@name"], symbol["@size"]))
-                self.gen.fact(fn.symbol_type(symbol["@name"], symbol["@type"]))
-                self.gen.fact(fn.symbol_binding(symbol["@name"], symbol["@binding"]))
-                self.gen.fact(
-                    fn.symbol_visibility(symbol["@name"], symbol["@visibility"])
-                )
-                self.gen.fact(
-                    fn.symbol_is_defined(symbol["@name"], symbol["@is-defined"])
-                )
-                self.gen.fact(fn.has_symbol(corpus["@path"], symbol["@name"]))
+                self._generate_variable_symbol(corpus["@path"], symbol)
+
+    def _generate_function_symbol(self, corpus, symbol):
+        """Generate facts for an elf function symbol"""
+        self.gen.fact(fn.symbol(symbol["@name"]))
+
+        # A symbol might be defined across two corpora with
+        # different attributes, so we include the corpora here
+        self.gen.fact(fn.symbol_type(corpus, symbol["@name"], symbol["@type"]))
+        self.gen.fact(fn.symbol_binding(corpus, symbol["@name"], symbol["@binding"]))
+        self.gen.fact(
+            fn.symbol_visibility(corpus, symbol["@name"], symbol["@visibility"])
+        )
+        self.gen.fact(
+            fn.symbol_is_defined(corpus, symbol["@name"], symbol["@is-defined"])
+        )
+        # This might be redundant since the corpora is included in the above
+        self.gen.fact(fn.has_symbol(corpus, symbol["@name"]))
+
+    def _generate_variable_symbol(self, corpus, symbol):
+        """Generate facts for an elf variable symbol (has added size)"""
+        self.gen.fact(fn.symbol(symbol["@name"]))
+        self.gen.fact(fn.symbol_size(symbol["@name"], symbol["@size"]))
+        self.gen.fact(fn.symbol_type(symbol["@name"], symbol["@type"]))
+        self.gen.fact(fn.symbol_binding(symbol["@name"], symbol["@binding"]))
+        self.gen.fact(fn.symbol_visibility(symbol["@name"], symbol["@visibility"]))
+        self.gen.fact(fn.symbol_is_defined(symbol["@name"], symbol["@is-defined"]))
+        self.gen.fact(fn.has_symbol(corpus, symbol["@name"]))
 
     def generate_corpus_metadata(self, corpora):
         """Given a list of corpora, create a fact for each one. This includes
@@ -884,21 +898,137 @@ class ABICompatSolverSetup(object):
         # Use the corpus path as a unique id (ok if binaries exist)
         # This would need to be changed if we don't have the binary handy
         for corpus in corpora:
+            self._generate_corpus(corpus)
+            for needed in corpus.get("elf-needed", {}).get("dependency", []):
+                self._generate_needed(corpus["@path"], needed)
 
-            self.gen.h2("Corpus facts: %s" % corpus["@path"])
-            self.gen.fact(fn.corpus(corpus["@path"]))
+    def _generate_corpus(self, corpus):
+        """Generate the facts for the attributes of an abi-corpus"""
+        self.gen.h2("Corpus facts: %s" % corpus["@path"])
+        self.gen.fact(fn.corpus(corpus["@path"]))
 
-            # The needed libraries don't have full paths
-            self.gen.fact(
-                fn.corpus_basename(corpus["@path"], os.path.basename(corpus["@path"]))
-            )
-            self.gen.fact(
-                fn.corpus_architecture(corpus["@path"], corpus["@architecture"])
-            )
+        # The needed libraries don't have full paths
+        self.gen.fact(
+            fn.corpus_basename(corpus["@path"], os.path.basename(corpus["@path"]))
+        )
+        self.gen.fact(fn.corpus_architecture(corpus["@path"], corpus["@architecture"]))
+
+    def _generate_needed(self, corpus, needed):
+        """Generate facts for a needed library (an elf-needed dependency)"""
+        self.gen.fact(fn.corpus_needs_library(corpus, needed["@name"]))
+        self.gen.fact(fn.corpus_needs_library(corpus, needed["@name"]))
+
+    def stream_corpus(self, xml_file):
+        """Generate facts for a corpus while we parse it, so we never hold the
+        whole xml in memory. iterparse hands us each element when it closes, we
+        turn it into the same dict that xmltodict gives us, generate facts with
+        the same functions as a loaded corpus, and then throw it away. The facts
+        are the same, but come in document order and one corpus at a time.
+        """
+        corpus = None
+
+        # The elements we are inside of, and [name, unparsed children] for
+        # each namespace (they can be huge, so we don't load them whole)
+        elements = []
+        namespaces = []
+
+        with open_xml(xml_file) as fd:
+            for event, element in ElementTree.iterparse(fd, ("start", "end")):
+                if event == "start":
+                    parent = elements[-1].tag if elements else None
+                    elements.append(element)
+
+                    # The parser can read ahead, so we only trust attributes here
+                    if element.tag == "abi-corpus":
+                        corpus = element.get("path")
+                        self._generate_corpus(get_attributes(element))
+                    elif element.tag == "abi-instr" and parent == "abi-corpus":
+                        self._generate_abi_instr(corpus, get_attributes(element))
+                    elif element.tag == "namespace-decl" and parent in [
+                        "abi-instr",
+                        "namespace-decl",
+                    ]:
+                        namespace = namespaces[-1][0] if namespaces else None
+                        name = self._add_namespace(
+                            corpus, get_attributes(element), namespace
+                        )
+                        namespaces.append([name, []])
+                    continue
 
-            for needed in corpus.get("elf-needed", {}).get("dependency", []):
-                self.gen.fact(fn.corpus_needs_library(corpus["@path"], needed["@name"]))
-                self.gen.fact(fn.corpus_needs_library(corpus["@path"], needed["@name"]))
+                elements.pop()
+                parent = elements[-1].tag if elements else None
+                tag = element.tag
+
+                if tag == "dependency" and parent == "elf-needed":
+                    self._generate_needed(corpus, get_attributes(element))
+                elif tag == "elf-symbol" and parent == "elf-function-symbols":
+                    self._generate_function_symbol(corpus, get_attributes(element))
+                elif tag == "elf-symbol" and parent == "elf-variable-symbols":
+                    self._generate_variable_symbol(corpus, get_attributes(element))
+                elif tag == "namespace-decl" and parent in [
+                    "abi-instr",
+                    "namespace-decl",
+                ]:
+                    # Alert the developer if we are missing something!
+                    for attr in namespaces.pop()[1]:
+                        print("% Found namespace child not being parsed: " + attr)
+                elif parent == "abi-instr":
+                    self._generate_abi_instr_child(
+                        corpus, tag, element_to_dict(element)
+                    )
+                elif parent == "namespace-decl":
+                    name, unparsed = namespaces[-1]
+                    if tag == "class-decl":
+                        self._generate_class_decl(
+                            corpus, element_to_dict(element), name
+                        )
+                    elif tag == "function-decl":
+                        self._generate_function_decl(
+                            corpus, element_to_dict(element), name
+                        )
+                    elif tag not in unparsed:
+                        unparsed.append(tag)
+                elif parent != "abi-corpus":
+                    continue
+
+                # We are done with the element, so free it (and the parent's
+                # reference to it)
+                element.clear()
+                if elements:
+                    elements[-1].remove(element)
+
+        # Let's assume we require each to have a corpus
+        if not corpus:
+            sys.exit("One or more corpora are malformed, missing abi-corpus.")
+
+    def generate_index_facts(self, index, symbols):
+        """Generate facts for a corpus index, but only for the functions that
+        some elf symbols need and the types that they reach. The elements come
+        from the index, so we only read the parts of the xml that we need.
+        """
+        corpus = index.path
+        self._generate_corpus({"@path": corpus, "@architecture": index.architecture})
+
+        type_ids = index.get_dependencies(symbols=symbols)
+        seen = set()
+        for top in index.get_tops(type_ids, symbols):
+            tag, offset, names = index.tops[top]
+            data = element_to_dict(index.read_element(offset))
+
+            # Add the namespaces the element is in (we only do this once)
+            namespace = None
+            for name in names:
+                entry = {"@name": name}
+                if self._get_namespaced_name(name, namespace) not in seen:
+                    seen.add(self._add_namespace(corpus, entry, namespace))
+                namespace = self._get_namespaced_name(name, namespace)
+
+            if tag == "class-decl" and namespace:
+                self._generate_class_decl(corpus, data, namespace)
+            elif tag == "function-decl" and namespace:
+                self._generate_function_decl(corpus, data, namespace)
+            else:
+                self._generate_abi_instr_child(corpus, tag, data)
 
     def setup(self, driver, xml_files, tests=False):
         """Generate an ASP program with relevant constraints for a binary
@@ -916,6 +1046,16 @@ class ABICompatSolverSetup(object):
         # Every fact, entity that we make needs a unique id
         self._condition_id_counter = itertools.count()
 
+        # driver is used by all the functions below to add facts and
+        # rules to generate an ASP program.
+        self.gen = driver
+
+        if self.stream:
+            self.gen.h1("Corpus Facts")
+            for xml_file in xml_files:
+                self.stream_corpus(xml_file)
+            return
+
         # read in each corpus xml
         corpora = []
         for xml_file in xml_files:
@@ -926,10 +1066,6 @@ class ABICompatSolverSetup(object):
                 sys.exit("One or more corpora are malformed, missing abi-corpus.")
             corpora.append(corpus)
 
-        # driver is used by all the functions below to add facts and
-        # rules to generate an ASP program.
-        self.gen = driver
-
         self.gen.h1("Corpus Facts")
 
         # Generate high level corpus metadata facts
@@ -942,18 +1078,289 @@ class ABICompatSolverSetup(object):
         self.generate_dwarf_info_entries(corpora)
 
 
+# The magic bytes of compressed files that we can read directly
+compression_magic = [
+    (b"\x1f\x8b", gzip.open),
+    (b"\xfd7zXZ\x00", lzma.open),
+    (b"BZh", bz2.open),
+]
+
+
+def open_xml(xml_file):
+    """Open an xml file for reading (as bytes). If it's compressed (gzip, xz
+    or bz2, sniffed by magic bytes) we decompress it as we read.
+    """
+    with open(xml_file, "rb") as fd:
+        magic = fd.read(6)
+
+    # The opener opens (and closes) the file itself
+    for prefix, opener in compression_magic:
+        if magic.startswith(prefix):
+            return opener(xml_file, "rb")
+    return open(xml_file, "rb")
+
+
 def load_xml(xml_file):
-    with open(xml_file, "r") as fd:
-        content = xmltodict.parse(fd.read())
+    with open_xml(xml_file) as fd:
+        content = xmltodict.parse(fd)
     return content
 
 
-def generate_facts(xml_files):
+def get_attributes(element):
+    """Get the attributes of an element, named like xmltodict does"""
+    return {"@" + key: value for key, value in element.attrib.items()}
+
+
+def element_to_dict(element):
+    """Convert an element (and children) into the structure xmltodict would
+    give us, so we can stream an xml file and use the same fact generators.
+    """
+    entry = get_attributes(element)
+    for child in element:
+        value = element_to_dict(child)
+        if child.tag not in entry:
+            entry[child.tag] = value
+        elif isinstance(entry[child.tag], list):
+            entry[child.tag].append(value)
+        else:
+            entry[child.tag] = [entry[child.tag], value]
+
+    text = (element.text or "").strip()
+    if text and not entry:
+        return text
+    if text:
+        entry["#text"] = text
+    return entry or None
+
+
+class _ElementDone(Exception):
+    """Raised to stop parsing when we have read a whole element"""
+
+
+class CorpusIndex(object):
+    """A random access index over an abidw xml corpus. One pass over the xml
+    records the byte offset of every element with an id (types) and every
+    function-decl with an elf-symbol-id, along with the top level element
+    (what the fact generators parse) that holds it. The index is saved in a
+    sidecar file, so later we can read one type (and what it needs) without
+    parsing the rest of the corpus. For a compressed xml the offsets are in
+    the decompressed stream. The first read decompresses the whole xml and
+    keeps it in memory, so later reads seek in that instead of decompressing
+    from the start every time.
+    """
+
+    version = 1
+
+    def __init__(self, xml_file, index_file=None):
+        self.xml_file = os.path.abspath(xml_file)
+        self.index_file = index_file or self.xml_file + ".index"
+        self.decompressed = None
+        if not os.path.exists(self.xml_file):
+            sys.exit("%s does not exist." % xml_file)
+        if not self.load():
+            self.build()
+            self.save()
+
+    def __str__(self):
+        return "[CorpusIndex:%s]" % self.xml_file
+
+    def __repr__(self):
+        return str(self)
+
+    def get_stamp(self):
+        """The size and modified time of the xml, to know if an index is stale"""
+        stat = os.stat(self.xml_file)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def load(self):
+        """Load the index from the sidecar file, if it exists and is current"""
+        try:
+            with open(self.index_file, "r") as fd:
+                index = json.load(fd)
+        except (OSError, ValueError):
+            return False
+        stamp = [index.get("version"), index.get("stamp")]
+        if stamp != [self.version, self.get_stamp()]:
+            return False
+        self.index = index
+        return True
+
+    def save(self):
+        """Save the index to the sidecar file (atomically)"""
+        tmpfile = "%s.%s.tmp" % (self.index_file, os.getpid())
+        try:
+            with open(tmpfile, "w") as fd:
+                json.dump(self.index, fd)
+            os.replace(tmpfile, self.index_file)
+        except OSError as e:
+            print("% Warning, cannot save index " + self.index_file + ": " + str(e))
+
+    def build(self):
+        """Parse the xml once, and record the offset of each element we care
+        about. A top is [tag, offset, namespaces], and types and symbols are
+        [offset, top] (the top is None if the generators don't reach it).
+        """
+        index = {
+            "version": self.version,
+            "stamp": self.get_stamp(),
+            "path": None,
+            "architecture": None,
+            "tops": [],
+            "types": {},
+            "symbols": {},
+        }
+        parser = expat.ParserCreate()
+
+        # [tag, is top] for each element we are in, and the current namespaces
+        stack = []
+        namespaces = []
+        tops = index["tops"]
+
+        def start(tag, attrs):
+            offset = parser.CurrentByteIndex
+            parent = stack[-1][0] if stack else None
+            is_top = False
+
+            if tag == "abi-corpus" and not index["path"]:
+                index["path"] = attrs.get("path")
+                index["architecture"] = attrs.get("architecture")
+            elif tag == "namespace-decl" and parent in [
+                "abi-instr",
+                "namespace-decl",
+            ]:
+                namespaces.append(attrs.get("name"))
+            elif parent == "abi-instr" or (
+                parent == "namespace-decl" and tag in ["class-decl", "function-decl"]
+            ):
+                is_top = True
+                tops.append([tag, offset, list(namespaces)])
+            stack.append([tag, is_top])
+
+            # The top that holds this element, if we are in one
+            top = len(tops) - 1 if any(x[1] for x in stack) else None
+            if "id" in attrs:
+                index["types"].setdefault(attrs["id"], [offset, top])
+            if tag == "function-decl" and "elf-symbol-id" in attrs:
+                index["symbols"].setdefault(attrs["elf-symbol-id"], [offset, top])
+
+        def end(tag):
+            stack.pop()
+            parent = stack[-1][0] if stack else None
+            if tag == "namespace-decl" and parent in ["abi-instr", "namespace-decl"]:
+                namespaces.pop()
+
+        parser.StartElementHandler = start
+        parser.EndElementHandler = end
+        with open_xml(self.xml_file) as fd:
+            parser.ParseFile(fd)
+
+        if not index["path"]:
+            sys.exit("%s is malformed, missing abi-corpus." % self.xml_file)
+        self.index = index
+
+    @property
+    def path(self):
+        return self.index["path"]
+
+    @property
+    def architecture(self):
+        return self.index["architecture"]
+
+    @property
+    def tops(self):
+        return self.index["tops"]
+
+    def open_xml(self):
+        """Open the xml to read elements from, using the decompressed copy
+        of a compressed xml (making it the first time).
+        """
+        if self.decompressed is not None:
+            return io.BytesIO(self.decompressed)
+        fd = open_xml(self.xml_file)
+        if isinstance(fd, io.BufferedReader):
+            return fd
+        with fd:
+            self.decompressed = fd.read()
+        return io.BytesIO(self.decompressed)
+
+    def read_element(self, offset):
+        """Read (only) the element that starts at an offset in the xml"""
+        builder = ElementTree.TreeBuilder()
+        parser = expat.ParserCreate()
+        depth = [0]
+
+        def start(tag, attrs):
+            depth[0] += 1
+            builder.start(tag, attrs)
+
+        def end(tag):
+            builder.end(tag)
+            depth[0] -= 1
+            if not depth[0]:
+                raise _ElementDone()
+
+        parser.StartElementHandler = start
+        parser.EndElementHandler = end
+        parser.CharacterDataHandler = builder.data
+        with self.open_xml() as fd:
+            fd.seek(offset)
+            try:
+                while True:
+                    chunk = fd.read(64 * 1024)
+                    parser.Parse(chunk, not chunk)
+                    if not chunk:
+                        break
+            except _ElementDone:
+                pass
+        return builder.close()
+
+    def get_type(self, type_id):
+        """Get the element for a type id, or None if we don't have it"""
+        if type_id in self.index["types"]:
+            return self.read_element(self.index["types"][type_id][0])
+
+    def get_function(self, symbol):
+        """Get the function-decl for an elf symbol id, or None"""
+        if symbol in self.index["symbols"]:
+            return self.read_element(self.index["symbols"][symbol][0])
+
+    def get_dependencies(self, type_ids=None, symbols=None):
+        """Get the type ids that some types and functions (by elf symbol id)
+        need, following type-id references until there are no new ones.
+        """
+        elements = [self.get_function(symbol) for symbol in symbols or []]
+        found = set()
+        todo = list(type_ids or [])
+        while elements or todo:
+            for element in elements:
+                if element is None:
+                    continue
+                for child in element.iter():
+                    type_id = child.get("type-id")
+                    if type_id in self.index["types"] and type_id not in found:
+                        todo.append(type_id)
+            elements = []
+            while todo:
+                type_id = todo.pop()
+                if type_id in found or type_id not in self.index["types"]:
+                    continue
+                found.add(type_id)
+                elements.append(self.get_type(type_id))
+        return found
+
+    def get_tops(self, type_ids=None, symbols=None):
+        """Get the sorted tops that hold some types and functions"""
+        entries = [self.index["types"].get(x) for x in type_ids or []]
+        entries += [self.index["symbols"].get(x) for x in symbols or []]
+        return sorted(set(x[1] for x in entries if x and x[1] is not None))
+
+
+def generate_facts(xml_files, stream=False):
     """A single function to print facts for one or more corpora."""
     if not isinstance(xml_files, list):
         xml_files = [xml_files]
 
-    setup = ABICompatSolverSetup()
+    setup = ABICompatSolverSetup(stream=stream)
     driver = PyclingoDriver()
     return driver.solve(setup, xml_files, facts_only=True)
 
@@ -967,6 +1374,7 @@ def is_compatible(
     stats=False,
     tests=False,
     logic_programs=None,
+    stream=False,
 ):
     """Given two dumps of library xml generated by libabigail, generate
     facts for each to then determine if the two are compatible. We
@@ -978,13 +1386,14 @@ def is_compatible(
         library_xml (str): path to libabigail xml for a library
         dump (tuple): what to dump
         models (int): number of models to search (default: 0)
+        stream (bool): parse the xml as a stream (for large corpora)
     """
     driver = PyclingoDriver()
     if "asp" in dump:
         driver.out = sys.stdout
 
     # Create the parser, and generate the corpus
-    setup = ABICompatSolverSetup()
+    setup = ABICompatSolverSetup(stream=stream)
     return driver.solve(
         setup,
         [binary_xml, library_xml],
@@ -6,12 +6,37 @@
 # the parsing to be slower at best :)
 
 import os
+import gzip
+import hashlib
 import json
 import shutil
 import subprocess
 import sys
+import tempfile
 import threading
+import time
+import xml.etree.ElementTree as ElementTree
+from xml.parsers.expat import ExpatError
 import xmltodict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# pyelftools is optional, and lets us use the build-id of a library
+try:
+    from elftools.elf.elffile import ELFFile
+except ImportError:
+    ELFFile = None
+
+# Elements in abidw output that hold other elements, which we stream through
+# (instead of yielding them whole)
+containers = [
+    "abi-corpus-group",
+    "abi-corpus",
+    "abi-instr",
+    "elf-needed",
+    "elf-function-symbols",
+    "elf-variable-symbols",
+    "namespace-decl",
+]
 
 
 class LibabigailWrapper:
@@ -32,15 +57,161 @@ class LibabigailWrapper:
     def __repr__(self):
         return str(self)
 
-    def abidw(self, library):
-        """A wrapper for abidw. Requires input of an existing binary to parse
+    def abidw(self, library, stream=False):
+        """A wrapper for abidw. Requires input of an existing binary to parse.
+        If stream is True, we parse the output as abidw writes it, so we only
+        hold the result (and not the output lines and a string of them too).
         """
         if not os.path.exists(library):
             sys.exit("%s does not exist." % library)
+        if stream:
+            runner = CommandRunner()
+            try:
+                result = xmltodict.parse(
+                    runner.stream_command([self._wrapped["abidw"], library])
+                )
+
+            # A failed abidw gives us empty (or partial) output, show the error
+            except ExpatError:
+                if runner.retval is not None:
+                    self._check_runner(runner, "abidw")
+                raise
+            self._check_runner(runner, "abidw")
+            return result
         runner = self.run_tool("abidw", library)
         # This could probably be streamed on reading, but seems to work on
         return xmltodict.parse("\n".join(runner.output))
 
+    def iter_abidw(self, library, chunk_size=64 * 1024):
+        """Run abidw and parse the output as it is written, yielding
+        (path, tag, entry) for each element in the corpus. The path is a list
+        of (tag, attributes) for the elements it's in (e.g., the abi-corpus and
+        abi-instr) and the entry is the element as xmltodict would give it.
+        We only hold one element (and a chunk of output) at once, so memory
+        doesn't grow with the size of the library.
+        """
+        if not os.path.exists(library):
+            sys.exit("%s does not exist." % library)
+
+        # The containers we are in, and all the elements we are in
+        path = []
+        elements = []
+
+        parser = ElementTree.XMLPullParser(events=("start", "end"))
+        runner = CommandRunner()
+        for chunk in runner.stream_command(
+            [self._wrapped["abidw"], library], chunk_size
+        ):
+            parser.feed(chunk)
+            for event, element in parser.read_events():
+                if event == "start":
+                    if len(path) == len(elements) and element.tag in containers:
+                        path.append((element.tag, dict(element.attrib)))
+                    elements.append(element)
+                    continue
+
+                elements.pop()
+
+                # The end of a container, or an element in a container
+                if len(path) > len(elements):
+                    path.pop()
+                elif len(path) == len(elements):
+                    yield list(path), element.tag, element_to_dict(element)
+                else:
+                    continue
+
+                # We are done with the element, so free it
+                element.clear()
+                if elements:
+                    elements[-1].remove(element)
+
+        self._check_runner(runner, "abidw")
+        parser.close()
+
+    def abidw_many(self, paths, jobs=None, options=None, cache_dir=None, timers=False):
+        """Run abidw for many libraries, with at most jobs running at once
+        (defaults to the number of cpus). With a cache_dir, outputs are cached
+        by the library content (build-id or sha256), abidw version and options,
+        and we don't run abidw on a hit. An AbidwJob is yielded as each one
+        finishes, with the seconds it took and the queue depth when it started.
+        """
+        options = list(options or [])
+
+        # We go through the paths more than once (e.g., a generator)
+        paths = list(paths)
+        for path in paths:
+            if not os.path.exists(path):
+                sys.exit("%s does not exist." % path)
+
+        cache = AbidwCache(cache_dir) if cache_dir else None
+        version = self.abidw_version if cache else None
+        waiting = [len(paths)]
+        lock = threading.Lock()
+
+        def run(job):
+            with lock:
+                waiting[0] -= 1
+                job.queue_depth = waiting[0]
+            start = time.time()
+            key = None
+            if cache:
+                try:
+                    key = cache.get_key(job.path, version, options)
+                except Exception as e:
+                    print("Cannot get a cache key for %s: %s" % (job.path, e))
+            if key:
+                job.output = cache.load(key)
+                job.cached = job.output is not None
+                job.retval = 0 if job.cached else None
+            if not job.cached:
+                runner = self.run_tool("abidw", *options, job.path)
+                job.retval = runner.retval
+                job.error = "".join(runner.error)
+                if runner.retval == 0:
+                    job.output = "".join(runner.output)
+                    if key:
+                        cache.save(key, job.output)
+            job.seconds = time.time() - start
+            return job
+
+        start = time.time()
+        executor = ThreadPoolExecutor(max_workers=jobs or os.cpu_count() or 1)
+        try:
+            futures = [executor.submit(run, AbidwJob(path)) for path in paths]
+            for future in as_completed(futures):
+                job = future.result()
+                if timers:
+                    print(
+                        "%8.3fs queue %4d %-6s %s"
+                        % (
+                            job.seconds,
+                            job.queue_depth,
+                            "cached" if job.cached else job.retval,
+                            job.path,
+                        )
+                    )
+                yield job
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+        if timers:
+            print("%d libraries in %.3fs" % (len(paths), time.time() - start))
+            if cache:
+                print("cache: %s" % cache.stats)
+
+    @property
+    def abidw_version(self):
+        """The version of abidw (e.g., abidw: 2.0.0), we only ask once"""
+        if not hasattr(self, "_abidw_version"):
+            runner = self.run_tool("abidw", "--version")
+            self._abidw_version = "".join(runner.output).strip()
+        return self._abidw_version
+
+    def _check_runner(self, runner, tool):
+        """Exit with the error output if a tool failed"""
+        if runner.retval != 0:
+            sys.exit("%s failed: %s" % (tool, "".join(runner.error)))
+
     def abidiff(self):
         print("not written")
         
@@ -91,7 +262,116 @@ class LibabigailWrapper:
         if (path := shutil.which(name)):
             return path
 
-        
+
+
+class AbidwJob:
+    """An AbidwJob is one library that abidw_many dumps. The output is the
+    xml from abidw (None if it failed), and the result is it parsed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.output = None
+        self.error = ""
+        self.retval = None
+        self.cached = False
+        self.seconds = None
+        self.queue_depth = None
+
+    def __str__(self):
+        return "[AbidwJob:%s]" % self.path
+
+    def __repr__(self):
+        return str(self)
+
+    @property
+    def result(self):
+        if self.output is not None:
+            return xmltodict.parse(self.output)
+
+
+class AbidwCache:
+    """An AbidwCache is a directory of (gzipped) abidw outputs, so libraries
+    that we've dumped before (with the same abidw and options) are not dumped
+    again. Entries are keyed by the content of the library (the build-id or
+    sha256, and the size, since a stripped library keeps its build-id), its
+    path (abidw writes it into the corpus), the abidw version and options.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def __str__(self):
+        return "[AbidwCache:%s]" % self.cache_dir
+
+    def __repr__(self):
+        return str(self)
+
+    @property
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+    def get_key(self, path, version, options):
+        # abidw writes the path into the corpus, so it's part of the key too
+        identity = [
+            os.path.abspath(path),
+            get_content_id(path),
+            os.path.getsize(path),
+            version,
+            options,
+        ]
+        return hashlib.sha256(json.dumps(identity).encode("utf-8")).hexdigest()
+
+    def get_path(self, key):
+        return os.path.join(self.cache_dir, key + ".xml.gz")
+
+    def load(self, key):
+        """Load a cached output, or None if we don't have it"""
+        try:
+            with gzip.open(self.get_path(key), "rt") as fd:
+                output = fd.read()
+        except (OSError, EOFError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return output
+
+    def save(self, key, output):
+        """Save an output, writing to a temporary file first so readers never
+        see half an entry
+        """
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt") as out:
+            out.write(output)
+        os.replace(tmp, self.get_path(key))
+
+
+def get_content_id(path):
+    """Get an id for the content of a library, the GNU build-id if we can read
+    it (with pyelftools) and otherwise the sha256 of the file.
+    """
+    if ELFFile is not None:
+        try:
+            with open(path, "rb") as fd:
+                section = ELFFile(fd).get_section_by_name(".note.gnu.build-id")
+                for note in getattr(section, "iter_notes", list)():
+                    if note["n_type"] == "NT_GNU_BUILD_ID":
+                        return note["n_desc"]
+
+        # Anything wrong with the ELF (e.g., truncated) falls back to sha256
+        except Exception:
+            pass
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as fd:
+        for chunk in iter(lambda: fd.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return "sha256-" + digest.hexdigest()
+
+
 class CommandRunner(object):
     """This is a CommandRunner that is derived from the one I wrote for caliper
     """
@@ -116,7 +396,7 @@ class CommandRunner(object):
             lines.append(s.decode("utf-8"))
         stream.close()
 
-    def run_command(self, cmd, env=None, **kwargs):
+    def popen(self, cmd, env=None, **kwargs):
         self.reset()
 
         # Preview the command for the uesr
@@ -128,10 +408,34 @@ class CommandRunner(object):
         if env:
             envars.update(env)
 
-        p = subprocess.Popen(
+        return subprocess.Popen(
             cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=envars, **kwargs
         )
 
+    def stream_command(self, cmd, chunk_size=64 * 1024, env=None, **kwargs):
+        """Run a command and yield its output (bytes) in chunks as it is
+        written, instead of saving it. The pipe is only read as fast as we
+        consume it, so the command waits for us instead of output piling up.
+        Errors are saved as usual, and retval is set when the output ends.
+        """
+        p = self.popen(cmd, env, **kwargs)
+        t2 = threading.Thread(target=self.reader, args=(p.stderr, "stderr"))
+        t2.start()
+        try:
+            while True:
+                chunk = p.stdout.read1(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            p.stdout.close()
+            p.wait()
+            t2.join()
+            self.retval = p.returncode
+
+    def run_command(self, cmd, env=None, **kwargs):
+        p = self.popen(cmd, env, **kwargs)
+
         # Create threads for error and output
         t1 = threading.Thread(target=self.reader, args=(p.stdout, "stdout"))
         t1.start()
@@ -145,5 +449,27 @@ class CommandRunner(object):
         return self.output
 
 
+def element_to_dict(element):
+    """Convert an element (and children) into the structure xmltodict would
+    give us for it.
+    """
+    entry = {"@" + key: value for key, value in element.attrib.items()}
+    for child in element:
+        value = element_to_dict(child)
+        if child.tag not in entry:
+            entry[child.tag] = value
+        elif isinstance(entry[child.tag], list):
+            entry[child.tag].append(value)
+        else:
+            entry[child.tag] = [entry[child.tag], value]
+
+    text = (element.text or "").strip()
+    if text and not entry:
+        return text
+    if text:
+        entry["#text"] = text
+    return entry or None
+
+
 if __name__ == '__main__':
     pass